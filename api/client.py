@@ -1,277 +1,298 @@
-import requests
-import os
-from typing import Optional
-from config.settings import API_URL
-import sqlite3
-from config.settings import DB_PATH
+import asyncio
+import re
+import time
+import aiohttp
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+from config.settings import (
+    API_URL, API_POOL_SIZE, API_TIMEOUT, PAGE_CACHE_TTL, PAGE_CACHE_SIZE, DETAIL_CACHE_TTL, DETAIL_CACHE_SIZE,
+    SUPPLIER_CATALOG_TTL
+)
+from api.tokens import TokenRefresher, is_token_expiring
+from utils.cache import TTLCache
+from utils.metrics import API_REQUEST_DURATION
+from utils.profiling import track, untracked
+from utils.db import update_access_token
+from utils.registry import user_registry
 
 # API_URL = os.getenv("API_URL", "https://example.com/api")
 LOGIN_ENDPOINT = "/auth/token/"
+SUPPLIERS_ENDPOINT = "/product_import_manager/suppliers/"
 HEADERS = {"Content-Type": "application/json"}
+ID_IN_PATH = re.compile(r"/\d+")
 
 class APIClient:
     def __init__(self):
-        self.access_token = None
-        self.refresh_token = None
-
-    def login(self, username, password):
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Страницы списков: ключ (тип списка, telegram_id, страница)
+        self.page_cache = TTLCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
+        # Детали заказов и заявок одинаковы для всех: ключ (тип, id)
+        self.detail_cache = TTLCache(DETAIL_CACHE_SIZE, DETAIL_CACHE_TTL)
+        # Каталог поставщиков один для всех пользователей
+        self.catalog_cache = TTLCache(1, SUPPLIER_CATALOG_TTL)
+        # Выполняющиеся запросы за кэшируемыми данными
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Сколько вызовов ждут каждую выполняющуюся загрузку
+        self._waiters: Dict[Hashable, int] = {}
+        self.token_refresher = TokenRefresher(self)
+        # Идущие обновления токенов: telegram_id -> задача
+        self._refreshing: Dict[int, asyncio.Future] = {}
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую HTTP-сессию с пулом keep-alive соединений."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=API_POOL_SIZE, ttl_dns_cache=300)
+            # Куки передаём явно в каждом запросе: сессия общая для всех пользователей
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=API_TIMEOUT),
+                headers=HEADERS,
+            )
+        return self.session
+
+    def invalidate_pages(self, kind: str):
+        """Сбрасывает кэш страниц списка ("orders" или "applications") у всех пользователей."""
+        self.page_cache.invalidate(lambda key: key[0] == kind)
+
+    async def _cached(self, cache: TTLCache, key: Hashable, fetch: Callable[[], Awaitable]):
+        """Возвращает данные из кэша или загружает их.
+
+        Одновременные запросы одного ключа (например, предзагрузка и нажатие
+        пользователя) ждут одну загрузку. Пустой ответ не кэшируется. Если
+        отменены все ожидающие (пользователь ушёл со страницы), отменяется и
+        сам запрос к сайту.
+        """
+        data = cache.get(key)
+        if data is not None:
+            return data
+        task = self._inflight.get(key)
+        if task is None:
+            # Загрузка общая для всех ожидающих: каждый учитывает только своё ожидание
+            task = asyncio.ensure_future(untracked(fetch()))
+            self._inflight[key] = task
+
+            def _done(task):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+                if not task.cancelled() and task.exception() is None and task.result():
+                    cache.set(key, task.result())
+
+            task.add_done_callback(_done)
+        # Отмена ожидающего не прерывает загрузку для остальных
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            with track("api"):
+                return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                # Больше никто не ждёт: прерываем запрос, новый вызов начнёт загрузку заново
+                task.cancel()
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def close(self):
+        """Закрывает HTTP-сессию."""
+        await self.token_refresher.stop()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _fetch(self, method: str, url: str, cookies: Optional[dict] = None, payload: Optional[dict] = None,
+                     headers: Optional[dict] = None):
+        """Выполняет HTTP-запрос и возвращает ответ и разобранный JSON (для 200/201)."""
+        started_at = time.perf_counter()
+        status = "error"
+        try:
+            with track("api"):
+                async with self.get_session().request(method, url, json=payload, cookies=cookies,
+                                                       headers=headers) as response:
+                    status = response.status
+                    data = None
+                    if response.status in (200, 201):
+                        data = await response.json(content_type=None)
+                    return response, data
+        finally:
+            # id в пути заменяем шаблоном, чтобы не плодить метки
+            endpoint = ID_IN_PATH.sub("/{id}", url[len(API_URL):])
+            API_REQUEST_DURATION.observe(time.perf_counter() - started_at, method=method, endpoint=endpoint,
+                                         status=status)
+
+    async def _send(self, method: str, endpoint: str, telegram_id: int, payload: Optional[dict] = None,
+                    raise_for_status: bool = False, headers: Optional[dict] = None):
+        """Запрос от имени пользователя с повтором после обновления токена при 401."""
+        url = f"{API_URL}{endpoint}"
+        cookies = self.get_cookies(telegram_id)
+        # Токен обновляется не больше одного раза за вызов: если refresh_token
+        # не действует, второе обновление и повтор запроса ничего не дадут
+        refreshed = False
+        if is_token_expiring(cookies["access_token"]):
+            # Токен уже истёк: обновляем до запроса, не дожидаясь 401
+            await self.refresh_access_token(telegram_id)
+            refreshed = True
+            cookies = self.get_cookies(telegram_id)
+        response, data = await self._fetch(method, url, cookies, payload, headers)
+        if response.status == 401:
+            # Токен мог уже обновить параллельный запрос — тогда просто повторяем
+            if not refreshed and self.get_cookies(telegram_id)["access_token"] == cookies["access_token"]:
+                await self.refresh_access_token(telegram_id)
+            if self.get_cookies(telegram_id)["access_token"] != cookies["access_token"]:
+                cookies = self.get_cookies(telegram_id)
+                response, data = await self._fetch(method, url, cookies, payload, headers)
+        if raise_for_status:
+            response.raise_for_status()  # Бросает исключение, если код ответа не 2xx
+        return response, data
+
+    async def login(self, username, password):
         """Авторизация пользователя и извлечение токенов из куки."""
-        url = f"{API_URL}/auth/token/"
+        url = f"{API_URL}{LOGIN_ENDPOINT}"
         payload = {"email": username, "password": password}
-        session = requests.Session()
-        response = session.post(url, json=payload)
-
-        if response.status_code == 200:
+        async with self.get_session().post(url, json=payload) as response:
+            if response.status != 200:
+                return None
             # Извлекаем токены из куки
-            cookies = session.cookies.get_dict()
-            access_token = cookies.get("access_token")
-            refresh_token = cookies.get("refresh_token")
-
-            if access_token and refresh_token:
-                return {"access_token": access_token, "refresh_token": refresh_token}
-            else:
-                raise ValueError("Токены отсутствуют в куки")
-
-        return None
-
-    def refresh_tokens(self) -> bool:
-        """Обновление токенов с использованием refresh-токена."""
-        if not self.refresh_token:
-            return False
-        
-        response = requests.post(
-            f"{API_URL}/auth/token/refresh/",
-            json={"refresh": self.refresh_token},
-            headers=HEADERS,
-        )
-        
-        if response.status_code == 200:
-            self.access_token = response.json().get("access")
-            return True
-        return False
-
-    def request(self, method: str, endpoint: str, data: Optional[dict] = None) -> Optional[dict]:
-        """Отправка запроса к API."""
-        if not self.access_token:
-            return None
-        
-        headers = {**HEADERS, "Authorization": f"Bearer {self.access_token}"}
-        url = f"{API_URL}{endpoint}"
-        response = requests.request(method, url, json=data, headers=headers)
-        
-        if response.status_code == 401:  # Unauthorized, пробуем обновить токен
-            if self.refresh_tokens():
-                headers["Authorization"] = f"Bearer {self.access_token}"
-                response = requests.request(method, url, json=data, headers=headers)
-        
-        if response.status_code in [200, 201]:
-            return response.json()
-        return None
-
-
-    def get_dashboard(self, telegram_id: int, start_date: str, end_date: str):
-        """Запрашивает дашборд за указанный период."""
-        url = f"{API_URL}/settings_site/dashboard/"
-        tokens = self.get_user_tokens(telegram_id)
+            access_token = response.cookies.get("access_token")
+            refresh_token = response.cookies.get("refresh_token")
 
-        if not tokens:
-            raise ValueError("Пользователь не авторизован в боте.")
+        if access_token and refresh_token:
+            return {"access_token": access_token.value, "refresh_token": refresh_token.value}
+        raise ValueError("Токены отсутствуют в куки")
 
-        access_token, refresh_token = tokens
+    async def get_dashboard(self, telegram_id: int, start_date: str, end_date: str):
+        """Запрашивает дашборд за указанный период."""
+        if not self.get_user_tokens(telegram_id):
+            raise ValueError("Пользователь не авторизован в боте.")
 
-        # Формируем куки для запроса
-        cookies = {
-            "access_token": access_token,
-            "refresh_token": refresh_token
-        }
         payload = {"date_in": start_date, "date_out": end_date}
-
-        # Отправляем запрос
-        response = requests.post(url, json=payload, cookies=cookies)
-
-
-        # Если токен истёк, пробуем обновить
-        if response.status_code == 401:
-            self.refresh_access_token(telegram_id)
-            tokens = self.get_user_tokens(telegram_id)
-            if not tokens:
-                raise ValueError("Не удалось обновить токен. Требуется повторная авторизация.")
-            access_token, refresh_token = tokens
-            cookies = {
-                "access_token": access_token,
-                "refresh_token": refresh_token
-            }
-            response = requests.post(url, json=payload, cookies=cookies)
-
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:
+        response, data = await self._send("POST", "/settings_site/dashboard/", telegram_id, payload)
+        if response.status == 401:
             raise ValueError("Доступ запрещён. Требуется авторизация.")
-        else:
-            response.raise_for_status()
-
-        return {}
+        response.raise_for_status()
+        return data or {}
 
     def get_user_tokens(self, telegram_id: int):
-        """Получает токены пользователя из базы данных."""
-        import sqlite3
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT access_token, refresh_token FROM users WHERE telegram_id = ?", (telegram_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result if result else None
-        
-    def update_cookies(self, new_cookies):
-        """Обновляет куки для последующих запросов."""
-        self.session_cookies.update(new_cookies)
-
-    def get_headers(self, telegram_id: int):
-        """Возвращает заголовки с токенами."""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT access_token FROM users WHERE telegram_id = ?", (telegram_id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        if result:
-            access_token = result[0]
-            return {"Authorization": f"Bearer {access_token}"}
-        return {}
-
-    def refresh_access_token(self, telegram_id: int):
-        """Обновляет access_token с использованием refresh_token."""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT refresh_token FROM users WHERE telegram_id = ?", (telegram_id,))
-        result = cursor.fetchone()
-
-        if result:
-            refresh_token = result[0]
-            url = f"{API_URL}/refresh"
-            response = requests.post(url, json={"refresh_token": refresh_token})
-            if response.status_code == 200:
-                new_access_token = response.json().get("access_token")
-                cursor.execute("UPDATE users SET access_token = ? WHERE telegram_id = ?", (new_access_token, telegram_id))
-                conn.commit()
-
-        conn.close()
-
-    def get_orders(self, telegram_id: int, page: int):
-        """Получение списка заказов."""
-        # order/list/1/
-        url = f"{API_URL}/order/list/{page}/"
+        """Получает токены пользователя из реестра в памяти."""
+        return user_registry.get_tokens(telegram_id)
+
+    async def refresh_access_token(self, telegram_id: int):
+        """Обновляет access_token с использованием refresh_token.
+
+        Одновременные вызовы для одного пользователя ждут одно обновление.
+        """
+        task = self._refreshing.get(telegram_id)
+        if task is None:
+            task = asyncio.ensure_future(untracked(self._refresh_access_token(telegram_id)))
+            self._refreshing[telegram_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(telegram_id, None))
+        with track("api"):
+            await asyncio.shield(task)
+
+    async def _refresh_access_token(self, telegram_id: int):
         tokens = self.get_user_tokens(telegram_id)
-        if not tokens:
+
+        if tokens:
+            refresh_token = tokens[1]
+            response, data = await self._fetch("POST", f"{API_URL}/refresh", payload={"refresh_token": refresh_token})
+            if response.status == 200:
+                await update_access_token(telegram_id, data.get("access_token"))
+
+    async def get_orders(self, telegram_id: int, page: int, cached: bool = True):
+        """Получение списка заказов; cached=False — мимо кэша страниц (фоновые обходы)."""
+        # order/list/1/
+        if not self.get_user_tokens(telegram_id):
             raise ValueError("Пользователь не авторизован в боте.")
-        access_token, refresh_token = tokens
-        # Формируем куки для запроса
-        cookies = {
-            "access_token": access_token,
-            "refresh_token": refresh_token
-        }
-        response = requests.get(url, cookies=cookies)
-        if response.status_code == 401:
-            # Если токен истёк, обновляем куки
-            self.refresh_access_token(telegram_id)
-            cookies = self.get_cookies(telegram_id)
-            response = requests.get(url, cookies=cookies)
-        response.raise_for_status()  # Бросает исключение, если код ответа не 2xx
-        return response.json()
 
-    def get_order_details(self, telegram_id: int, order_id: int):
+        async def fetch():
+            _, data = await self._send("GET", f"/order/list/{page}/", telegram_id, raise_for_status=True)
+            return data
+
+        if not cached:
+            return await fetch()
+        return await self._cached(self.page_cache, ("orders", telegram_id, page), fetch)
+
+    async def get_order_details(self, telegram_id: int, order_id: int):
         """Получение деталей заказа."""
-        url = f"{API_URL}/order/detail/{order_id}/"
-        tokens = self.get_user_tokens(telegram_id)
-        if not tokens:
+        if not self.get_user_tokens(telegram_id):
             raise ValueError("Пользователь не авторизован в боте.")
-        access_token, refresh_token = tokens
-        # Формируем куки для запроса
-        cookies = {
-            "access_token": access_token,
-            "refresh_token": refresh_token
-        }
-        response = requests.get(url, cookies=cookies)
-        if response.status_code == 401:
-            # Если токен истёк, обновляем куки
-            self.refresh_access_token(telegram_id)
-            cookies = self.get_cookies(telegram_id)
-            response = requests.get(url, cookies=cookies)
-        response.raise_for_status()  # Бросает исключение, если код ответа не 2xx
-        return response.json()
 
-    def get_applications(self, telegram_id: int, page: int):
+        async def fetch():
+            _, data = await self._send("GET", f"/order/detail/{order_id}/", telegram_id, raise_for_status=True)
+            return data
+
+        return await self._cached(self.detail_cache, ("order", order_id), fetch)
+
+    async def get_applications(self, telegram_id: int, page: int):
         """Получает список заявок с пагинацией."""
-        url = f"{API_URL}/feedback/list/{page}/"
-        cookies = self.get_cookies(telegram_id)  # Получаем авторизационные куки из базы
-        response = requests.get(url, cookies=cookies)
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:  # Если токен истёк
-            self.refresh_access_token(telegram_id)  # Обновляем токен
-            cookies = self.get_cookies(telegram_id)  # Получаем обновлённые куки
-            response = requests.get(url, cookies=cookies)
-            if response.status_code == 200:
-                return response.json()
-        return {}
-
-    def get_application_details(self, telegram_id: int, application_id: int):
+        async def fetch():
+            _, data = await self._send("GET", f"/feedback/list/{page}/", telegram_id)
+            return data
+
+        return await self._cached(self.page_cache, ("applications", telegram_id, page), fetch) or {}
+
+    async def get_application_details(self, telegram_id: int, application_id: int):
         """Получает детали конкретной заявки."""
-        url = f"{API_URL}/feedback/request/{application_id}/"
-        cookies = self.get_cookies(telegram_id)  # Получаем авторизационные куки из базы
-        response = requests.get(url, cookies=cookies)
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:  # Если токен истёк
-            self.refresh_access_token(telegram_id)  # Обновляем токен
-            cookies = self.get_cookies(telegram_id)  # Получаем обновлённые куки
-            response = requests.get(url, cookies=cookies)
-            if response.status_code == 200:
-                return response.json()
-        return {}
+        async def fetch():
+            _, data = await self._send("GET", f"/feedback/request/{application_id}/", telegram_id)
+            return data
+
+        return await self._cached(self.detail_cache, ("application", application_id), fetch) or {}
 
     def get_cookies(self, telegram_id: int):
-        """Получает авторизационные куки пользователя из базы данных."""
+        """Получает авторизационные куки пользователя из реестра."""
         tokens = self.get_user_tokens(telegram_id)
-        access_token, refresh_token = tokens
-        if access_token and refresh_token:
+        if tokens and tokens[0] and tokens[1]:
+            access_token, refresh_token = tokens
             return {
                 "access_token": access_token,
                 "refresh_token": refresh_token
             }
         raise ValueError("Пользователь не авторизован")
 
-    def get_supplier_import(self, telegram_id: int, supplier_slug: str):
-        """Получает информацию об импорте поставщика."""
-        url = f"{API_URL}/product_import_manager/supplier_import/"
-        cookies = self.get_cookies(telegram_id)
-        payload = {"slug": supplier_slug}  # Передача slug в теле запроса
+    async def get_suppliers(self, telegram_id: int) -> Dict[str, str]:
+        """Получает каталог поставщиков: slug -> название."""
+        async def fetch():
+            _, data = await self._send("GET", SUPPLIERS_ENDPOINT, telegram_id)
+            if isinstance(data, dict):
+                data = data.get("results") or data.get("data")
+            return {
+                supplier["slug"]: supplier.get("name") or supplier["slug"]
+                for supplier in data or [] if supplier.get("slug")
+            }
 
-        response = requests.post(url, json=payload, cookies=cookies)
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:  # Если токен истёк
-            self.refresh_access_token(telegram_id)
-            cookies = self.get_cookies(telegram_id)
-            response = requests.post(url, json=payload, cookies=cookies)
-            if response.status_code == 200:
-                return response.json()
-        return {}
+        return await self._cached(self.catalog_cache, "suppliers", fetch) or {}
 
-    def update_supplier_settings(self, telegram_id: int, supplier_slug: str, extra_charge: float):
+    async def get_supplier_import(self, telegram_id: int, supplier_slug: str):
+        """Получает информацию об импорте поставщика."""
+        payload = {"slug": supplier_slug}  # Передача slug в теле запроса
+        _, data = await self._send("POST", "/product_import_manager/supplier_import/", telegram_id, payload)
+        return data or {}
+
+    async def poll_supplier_import(self, telegram_id: int, supplier_slug: str, etag: Optional[str] = None):
+        """Условный запрос импорта поставщика: (данные, ETag).
+
+        Если сайт ответил 304 Not Modified на If-None-Match, данные — None.
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        response, data = await self._send("POST", "/product_import_manager/supplier_import/", telegram_id,
+                                          {"slug": supplier_slug}, headers=headers)
+        if response.status == 304:
+            return None, etag
+        if data is None:
+            raise RuntimeError(f"Импорт поставщика {supplier_slug}: ответ {response.status}")
+        return data, response.headers.get("ETag")
+
+    async def update_supplier_settings(self, telegram_id: int, supplier_slug: str, extra_charge: float):
         """Изменяет настройки поставщика."""
-        url = f"{API_URL}/product_import_manager/supplier_import/"
-        cookies = self.get_cookies(telegram_id)
         payload = {"slug": supplier_slug, "extra_charge": extra_charge}
-        print(f'{payload=}')
-        response = requests.put(url, json=payload, cookies=cookies)
-        if response.status_code == 200:
-            print(f'{response.json()=}')
-            return response.json()
-        elif response.status_code == 401:  # Если токен истёк
-            self.refresh_access_token(telegram_id)
-            cookies = self.get_cookies(telegram_id)
-            response = requests.put(url, json=payload, cookies=cookies)
-            if response.status_code == 200:
-                return response.json()
-        return {"status": "error"}
\ No newline at end of file
+        response, data = await self._send("PUT", "/product_import_manager/supplier_import/", telegram_id, payload)
+        if response.status == 200:
+            return data
+        return {"status": "error"}
+
+
+# Общий экземпляр клиента для app.py и всех обработчиков
+api_client = APIClient()
@@ -0,0 +1,80 @@
+import asyncio
+import base64
+import json
+import logging
+import time
+from typing import Optional
+from config.settings import TOKEN_REFRESH_MARGIN, TOKEN_CHECK_INTERVAL
+from utils.registry import user_registry
+
+log = logging.getLogger(__name__)
+
+
+def token_expiry(token: Optional[str]) -> Optional[float]:
+    """Возвращает время истечения JWT (поле exp) или None, если его не удалось прочитать.
+
+    Подпись не проверяется: значение нужно только для планирования обновления.
+    """
+    if not token:
+        return None
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+def is_token_expiring(token: Optional[str], margin: float = 0) -> bool:
+    """Истекает ли токен в ближайшие margin секунд."""
+    exp = token_expiry(token)
+    return exp is not None and exp - time.time() <= margin
+
+
+class TokenRefresher:
+    """Фоновое обновление access_token незадолго до истечения.
+
+    Пользовательские запросы в таком случае почти никогда не получают 401.
+    """
+
+    def __init__(self, client, margin: float = TOKEN_REFRESH_MARGIN, interval: float = TOKEN_CHECK_INTERVAL):
+        self.client = client
+        self.margin = margin
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh_expiring(self) -> float:
+        """Обновляет истекающие токены; возвращает, через сколько секунд проверять снова."""
+        now = time.time()
+        next_check = self.interval
+        for telegram_id, access_token, _ in user_registry.authorized_tokens():
+            exp = token_expiry(access_token)
+            if exp is None:
+                continue
+            if exp - now <= self.margin:
+                try:
+                    await self.client.refresh_access_token(telegram_id)
+                except Exception as e:
+                    log.warning("Не удалось обновить токен пользователя %s: %s", telegram_id, e)
+                    continue
+                tokens = user_registry.get_tokens(telegram_id)
+                exp = token_expiry(tokens[0]) if tokens else None
+                if exp is None:
+                    continue
+            # Не чаще раза в 30 секунд, даже если сайт не выдал новый токен
+            next_check = min(next_check, max(exp - self.margin - time.time(), 30))
+        return next_check
+
+    def start(self):
+        async def _loop():
+            while True:
+                await asyncio.sleep(await self.refresh_expiring())
+
+        self._task = asyncio.create_task(_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
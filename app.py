@@ -1,33 +1,73 @@
-from aiogram import Bot, Dispatcher, executor
+from aiogram import Bot, Dispatcher, executor, types
+from aiogram.bot.api import TelegramAPIServer
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from aiogram.contrib.middlewares.logging import LoggingMiddleware
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiohttp import web
-from config.settings import BOT_TOKEN
-from utils.db import init_db, add_user, remove_user, is_user_authorized, get_authorized_users
+from config.settings import (
+    BOT_TOKEN, TELEGRAM_API_SERVER, WEBAPP_HOST, WEBAPP_PORT, TELEGRAM_WEBHOOK_ENABLED, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH,
+    TELEGRAM_WEBHOOK_SECRET, UPDATES_CONCURRENCY, TELEGRAM_GLOBAL_RATE, WORKERS, DIGEST_MAX_ITEMS, DIGEST_MAX_BUTTONS
+)
+from utils.db import init_db, add_user, remove_user, is_user_authorized, get_notification_recipients, watch_users
+from utils.database import database
+from utils.fsm_storage import SQLiteStorage
+from utils.callbacks import callback_router, pack
+from utils.fanout import Notifier
+from utils.leases import leader
+from utils.outbox import outbox
+from utils.imports import import_watcher
+from utils.search import order_index
+from utils.preferences import preference_index
+from utils.dedup import event_key
+from utils.render import (
+    order_view, application_view, render_cache, order_digest_line, application_digest_line, DIGEST_HEADER, DIGEST_MORE,
+    render_import_alert, import_digest_line
+)
+from utils.metrics import (
+    registry as metrics_registry, register_cache, register_background, set_const_labels, WEBHOOK_EVENTS
+)
+from utils.middlewares import MetricsMiddleware
+from utils.profiling import ProfiledBot, ProfilingMiddleware
+from utils.prefetch import prefetcher
+from utils.workers import supervise
 import asyncio
-from api.client import APIClient
-import re
+import logging
+import os
+from api.client import api_client
 from handlers.applications import register_handlers as register_applications_handlers
 from handlers.orders import register_handlers as register_orders_handlers
-from handlers.stats import register_handlers as register_stats_handlers
+from handlers.stats import register_handlers as register_stats_handlers, current_ranges
+from handlers.notifications import register_handlers as register_notifications_handlers
+from handlers.suppliers import register_handlers as register_suppliers_handlers, supplier_catalog
+from handlers.menu import render_main_menu
+from utils.dashboard import dashboard_cache
 
 
 # Создаем бота и диспетчер
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(bot, storage=MemoryStorage())
-dp.middleware.setup(LoggingMiddleware())
+if TELEGRAM_API_SERVER:
+    bot = ProfiledBot(token=BOT_TOKEN, server=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+else:
+    bot = ProfiledBot(token=BOT_TOKEN)
+# Несколько процессов читают и пишут состояния диалогов напрямую в базу
+dp = Dispatcher(bot, storage=SQLiteStorage(database, shared=WORKERS > 1))
+dp.middleware.setup(ProfilingMiddleware())
+dp.middleware.setup(MetricsMiddleware())
+# Лимит Telegram общий для бота: делим его между процессами
+notifier = Notifier(bot, global_rate=TELEGRAM_GLOBAL_RATE / WORKERS)
 # Регистрация всех обработчиков
 register_applications_handlers(dp)
 register_orders_handlers(dp)
 register_stats_handlers(dp)
-# Создаём экземпляр API клиента
-api_client = APIClient()
+register_suppliers_handlers(dp)
+register_notifications_handlers(dp)
 
 # Инициализация базы данных
 init_db()
+dp.storage.init()
+outbox.init()
+leader.init()
+import_watcher.init()
+order_index.init()
 
 # Шаги для авторизации
 class AuthStates(StatesGroup):
@@ -57,42 +97,12 @@ async def menu_command(message: Message):
     """Вызывает главное меню."""
     await render_main_menu(message, message.from_user.id)
 
-# Основное меню
-async def render_main_menu(message_or_call, user_id: int):
-    """Отображает главное меню с учётом авторизации."""
-    authorized = is_user_authorized(user_id)
-
-    keyboard = InlineKeyboardMarkup()
-    if authorized:
-        keyboard.add(InlineKeyboardButton("📊 Статистика", callback_data="stats"))
-        keyboard.add(InlineKeyboardButton("📦 Заказы", callback_data="orders"))
-        keyboard.add(InlineKeyboardButton("📄 Заявки", callback_data="applications"))
-        keyboard.add(InlineKeyboardButton("🏢 Поставщики", callback_data="suppliers"))
-        keyboard.add(InlineKeyboardButton("🚪 Выход из системы", callback_data="logout"))
-        keyboard.add(InlineKeyboardButton("ℹ️ Помощь", callback_data="help"))
-        menu_message = "Вы авторизованы. Выберите действие:"
-    else:
-        keyboard.add(InlineKeyboardButton("🔑 Авторизация", callback_data="login"))
-        keyboard.add(InlineKeyboardButton("ℹ️ Помощь", callback_data="help"))
-        menu_message = "Вы не авторизованы. Пожалуйста, выполните авторизацию."
-
-    if isinstance(message_or_call, CallbackQuery):
-        await message_or_call.message.edit_text(menu_message, reply_markup=keyboard)
-        await message_or_call.answer()
-    elif isinstance(message_or_call, Message):
-        await message_or_call.answer(menu_message, reply_markup=keyboard)
-
-
-
 # Обработка команд с Inline-клавиатуры
-@dp.callback_query_handler(lambda call: call.data in ["stats", "login", "logout", "help", "back_to_main_menu"])
 async def handle_inline_commands(call: CallbackQuery):
     """Обработка команд с Inline-кнопок."""
     action = call.data
 
-    if action == "stats":
-        await show_stats_menu(call)
-    elif action == "login":
+    if action == "login":
         await login_command(call.message)
     elif action == "logout":
         await logout_command(call)
@@ -109,6 +119,7 @@ async def help_command(call: CallbackQuery):
     help_text = (
         "Доступные команды:\n"
         "- 📊 Статистика: просмотреть данные по диапазону\n"
+        "- /find: найти заказ по телефону, артикулу, фамилии или номеру\n"
         "- 🔑 Авторизация: войти в систему\n"
         "- 🚪 Выход из системы: разлогиниться\n"
         "- ℹ️ Помощь: показать это сообщение"
@@ -149,13 +160,13 @@ async def process_password(message: Message, state: FSMContext):
 
     try:
         # Авторизация через API
-        auth_response = api_client.login(login, password)
+        auth_response = await api_client.login(login, password)
         if auth_response:
             access_token = auth_response.get("access_token")
             refresh_token = auth_response.get("refresh_token")
             
             # Сохраняем пользователя в базе данных
-            add_user(
+            await add_user(
                 telegram_id=message.from_user.id,
                 access_token=access_token,
                 refresh_token=refresh_token
@@ -180,7 +191,7 @@ async def logout_command(call: CallbackQuery):
     user_id = call.from_user.id
 
     if is_user_authorized(user_id):
-        remove_user(user_id)
+        await remove_user(user_id)
 
         # Удаляем старое меню и отправляем сообщение
         await call.message.delete()
@@ -195,162 +206,82 @@ async def logout_command(call: CallbackQuery):
     await render_main_menu(call.message, call.from_user.id)
 
 
-# Обработка кнопки “📦 Поставщики”
-@dp.callback_query_handler(lambda call: call.data == "suppliers")
-async def show_suppliers(call: CallbackQuery):
-    """Отображает список поставщиков."""
-    keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("4 точки", callback_data="supplier_tochki"))
-    keyboard.add(InlineKeyboardButton("Бринекс", callback_data="supplier_brineks"))
-    keyboard.add(InlineKeyboardButton("Медведь", callback_data="supplier_medved"))
-    keyboard.add(InlineKeyboardButton("Шининвест", callback_data="supplier_shininvest"))
-    keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data="back_to_main_menu"))
-    await call.message.edit_text("Выберите поставщика:", reply_markup=keyboard)
-    await call.answer()
-
-@dp.callback_query_handler(lambda call: call.data.startswith("supplier_"))
-async def show_supplier_menu(call: CallbackQuery):
-    """Отображает меню конкретного поставщика."""
-    supplier_slug = call.data.split("_")[-1]
-    supplier_name = {
-        "tochki": "4 точки",
-        "brineks": "Бринекс",
-        "medved": "Медведь",
-        "shininvest": "Шининвест"
-    }.get(supplier_slug, "Неизвестный поставщик")
-
-    keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("📄 Информация об импорте", callback_data=f"import_{supplier_slug}"))
-    keyboard.add(InlineKeyboardButton("⚙️ Настройка", callback_data=f"suppliersettings_{supplier_slug}"))
-    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщикам", callback_data="suppliers"))
-
-    await call.message.edit_text(f"Меню поставщика: {supplier_name}", reply_markup=keyboard)
-    await call.answer()
-
-@dp.callback_query_handler(lambda call: call.data.startswith("import_"))
-async def show_import_info(call: CallbackQuery):
-    """Отображает информацию об импорте поставщика."""
-    supplier_slug = call.data.split("_")[1]
-    try:
-        import_data = api_client.get_supplier_import(call.from_user.id, supplier_slug)
-        if not import_data:
-            await call.message.edit_text("Не удалось получить информацию об импорте. Попробуйте позже.")
-            return
-
-        supplier = import_data.get("supplier_data", {})
-        tasks = import_data.get("task_results", {})
-        tire_task = tasks.get("tire", {})
-        disk_task = tasks.get("disk", {})
-
-        import_text = (
-            f"<b>🏢 Поставщик:</b> {supplier.get('name')}\n"
-            f"<b>💰 Наценка:</b> {supplier.get('extra_charge')}\n\n"
-            f"<b>Последние импорты:</b>\n"
-            f"🔹 <b>Шины:</b> {tire_task.get('last_status', 'Нет данных')}\n"
-            f"   <b>Дата:</b> {tire_task.get('last_run_time', 'Нет данных')}\n"
-            f"🔹 <b>Диски:</b> {disk_task.get('last_status', 'Нет данных')}\n"
-            f"   <b>Дата:</b> {disk_task.get('last_run_time', 'Нет данных')}\n"
-        )
-
-        keyboard = InlineKeyboardMarkup()
-        keyboard.add(InlineKeyboardButton("🔙 Назад к поставщику", callback_data=f"supplier_{supplier_slug}"))
+# Действия inline-кнопок: одна таблица вместо цепочки фильтров по префиксам
+for action in ("login", "logout", "help", "back_to_main_menu"):
+    callback_router.register(action, handle_inline_commands)
+callback_router.setup(dp)
 
-        await call.message.edit_text(import_text, reply_markup=keyboard, parse_mode="HTML")
-        await call.answer()
-    except Exception as e:
-        await call.message.edit_text(f"Произошла ошибка: {str(e)}")
 
-# Добавление состояния для настройки поставщика
-class SupplierSettingsStates(StatesGroup):
-    waiting_for_extra_charge = State()
+# Сообщение о новом заказе
+def order_notification(order: dict):
+    """Формирует уведомление о новом заказе."""
+    detail = order['detail']
+    order_text = order_view(detail, title="НОВЫЙ ЗАКАЗ")
 
-# Переход в раздел "Настройка"
-@dp.callback_query_handler(lambda call: call.data.startswith("suppliersettings_"))
-async def supplier_settings(call: CallbackQuery):
-    """Отображает раздел настройки поставщика."""
-    supplier_slug = call.data.split("_")[-1]
-    
-    # Новый текст сообщения с добавлением уникального элемента
-    new_text = (
-        f"Вы в разделе настройки поставщика: <b>{supplier_slug}</b>\n"
-        f"🔧 Здесь вы можете настроить параметры для этого поставщика."
-    )
-    
-    keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("✏️ Изменить наценку", callback_data=f"edit_extra_charge_{supplier_slug}"))
-    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщику", callback_data=f"supplier_{supplier_slug}"))
-    
-    # Проверяем, нужно ли обновлять сообщение
-    if call.message.text != new_text or call.message.reply_markup != keyboard:
-        await call.message.edit_text(new_text, reply_markup=keyboard, parse_mode="HTML")
-    else:
-        await call.answer("Сообщение уже актуально.")  # Чтобы убрать "загрузка" в Telegram
-
-# Начало изменения наценки
-@dp.callback_query_handler(lambda call: call.data.startswith("edit_extra_charge_"))
-async def edit_extra_charge_start(call: CallbackQuery):
-    """Предлагает ввести новую наценку."""
-    supplier_slug = call.data.split("_")[-1]
-    await SupplierSettingsStates.waiting_for_extra_charge.set()
-    # Сохраняем slug в состояние
-    async with dp.current_state(user=call.from_user.id).proxy() as state_data:
-        state_data["supplier_slug"] = supplier_slug
+    # Формирование клавиатуры
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("❌ Отменить", callback_data="cancel_edit"))
-    await call.message.edit_text(
-        f"Введите новую наценку для поставщика {supplier_slug}.\n"
-        "Значение должно быть числом, не меньше 1. Например: 1.1 или 1,1.",
-        reply_markup=keyboard
-    )
-    await call.answer()
-
-# Обработка ввода наценки
-@dp.message_handler(state=SupplierSettingsStates.waiting_for_extra_charge)
-async def process_extra_charge_input(message: Message, state: FSMContext):
-    """Обрабатывает ввод наценки."""
-    extra_charge_input = message.text.strip()
-    # Проверяем корректность значения
-    if not re.match(r"^\d+(\.\d+|,\d+)?$", extra_charge_input) or float(extra_charge_input.replace(",", ".")) < 1:
-        await message.answer("Некорректное значение. Убедитесь, что вы ввели число больше или равное 1. Например: 1.1 или 1,1.")
-        return
-
-    # Преобразуем значение к числовому формату
-    extra_charge = float(extra_charge_input.replace(",", "."))
-    
-    # Получаем slug из состояния
-    async with state.proxy() as state_data:
-        supplier_slug = state_data["supplier_slug"]
-
-    try:
-        # Отправляем изменения через API
-        response_data = api_client.update_supplier_settings(message.from_user.id, supplier_slug, extra_charge)
-
-        # Проверяем ключ "status"
-        if response_data.get("status") == "error":
-            await message.answer(f"Не удалось обновить наценку. Ошибка: {response_data.get('message', 'Неизвестная ошибка')}")
+    keyboard.add(InlineKeyboardButton("🔗 Перейти к заказу", url=f"https://ass74.ru/order/{detail['unique_token']}"))
+
+    return order_text, {"reply_markup": keyboard, "parse_mode": "HTML"}
+
+# Сообщение о новой заявке
+def feedback_notification(application: dict):
+    """Формирует уведомление о новой заявке обратной связи."""
+    application_text = application_view(application, title="НОВАЯ ЗАЯВКА")
+    return application_text, {"parse_mode": "HTML"}
+
+# Сводка нескольких уведомлений
+def digest_notification(events):
+    """Формирует одно сообщение о нескольких событиях с кнопками для просмотра каждого."""
+    lines = []
+    keyboard = InlineKeyboardMarkup(row_width=2)
+    buttons = []
+    for event_id, kind, payload in events[:DIGEST_MAX_ITEMS]:
+        if kind == "order":
+            lines.append(order_digest_line(payload['detail']))
+            label = f"📦 №{payload['detail']['id']}"
+        elif kind == "import":
+            lines.append(import_digest_line(payload))
+            label = f"🏭 {payload['supplier']}"
         else:
-            await message.answer(f"Наценка для поставщика {supplier_slug} успешно обновлена на {extra_charge}.")
-    except Exception as e:
-        await message.answer(f"Произошла ошибка: {str(e)}")
-    finally:
-        await state.finish()
-
-    # Возвращаемся в настройки поставщика
+            lines.append(application_digest_line(payload))
+            label = f"📄 №{payload['id']}"
+        if len(buttons) < DIGEST_MAX_BUTTONS:
+            buttons.append(InlineKeyboardButton(label, callback_data=pack("digest_item", event_id)))
+    keyboard.add(*buttons)
+
+    text = DIGEST_HEADER.format(count=len(events)) + "".join(lines)
+    if len(events) > DIGEST_MAX_ITEMS:
+        text += DIGEST_MORE.format(count=len(events) - DIGEST_MAX_ITEMS)
+    return text, {"reply_markup": keyboard, "parse_mode": "HTML", "disable_web_page_preview": True}
+
+# Оповещение об изменении импорта поставщика
+def import_notification(change: dict):
+    """Формирует оповещение о смене статуса импорта."""
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщику", callback_data=f"supplier_{supplier_slug}"))
-    await message.answer(f"Настройки для поставщика {supplier_slug} обновлены.", reply_markup=keyboard)
-    
-
-# Отмена изменения наценки
-@dp.callback_query_handler(lambda call: call.data == "cancel_edit", state=SupplierSettingsStates.waiting_for_extra_charge)
-async def cancel_edit(call: CallbackQuery, state: FSMContext):
-    """Отменяет изменение наценки."""
-    await state.finish()
-    await call.message.edit_text("Изменение наценки отменено.")
+    keyboard.add(InlineKeyboardButton("📄 Информация об импорте", callback_data=pack("import", change['slug'])))
+    return render_import_alert(change), {"reply_markup": keyboard, "parse_mode": "HTML"}
+
+# Кнопка сводки: полное уведомление о событии
+async def show_digest_item(call: CallbackQuery, event_id: int):
+    """Отправляет полное сообщение о событии из сводки."""
+    message = await outbox.event_message(event_id, call.message.chat.id)
+    if message is None:
+        await call.answer("Событие не найдено: старые уведомления удаляются из истории.", show_alert=True)
+        return
+    text, kwargs = message
+    await call.message.answer(text, **kwargs)
     await call.answer()
-    # Отображаем обновлённое меню
-    await render_main_menu(call.message, call.from_user.id)
 
+def notification_recipients(kind: str, payload: dict):
+    """Возвращает получателей уведомления о событии с учётом их настроек."""
+    return get_notification_recipients(kind, payload)
+
+outbox.register("order", order_notification)
+outbox.register("feedback", feedback_notification)
+outbox.register("import", import_notification)
+outbox.register_digest(digest_notification)
+callback_router.register("digest_item", show_digest_item, int)
 
 # Вебхук для новых заказов
 async def orders_webhook(request):
@@ -358,65 +289,26 @@ async def orders_webhook(request):
     try:
         order = await request.json()  # Получаем данные из запроса
         if not order:  # Проверяем, что данные существуют
+            WEBHOOK_EVENTS.inc(kind="order", result="invalid")
             return web.json_response({"error": "Invalid data"}, status=400)
 
-        # Основная информация о заказе
-        detail = order['detail']
-        order_text = (
-            f"<b>📦 НОВЫЙ ЗАКАЗ №{detail['id']}</b>\n\n"
-            f"<b>Информация о заказе:</b>\n"
-            f"📝 <b>Статус:</b> {detail['status']['status_name']}\n"
-            f"💰 <b>Сумма:</b> {detail['total_price_with_discount']} ₽\n"
-            f"📦 <b>Количество товаров:</b> {sum(item['quantity'] for item in detail['items'])}\n"
-            f"📦 <b>Количество позиций:</b> {len(detail['items'])}\n"
-            f"📍 <b>Адрес доставки:</b> {detail['address'] or 'Не указан'}\n\n"
-            f"<b>Информация о клиенте:</b>\n"
-            f"👤 <b>Имя:</b> {detail['first_name']} {detail['last_name'] or ''} {detail['patronymic'] or ''}\n"
-            f"📧 <b>Email:</b> {detail['email'] or 'Не указан'}\n"
-            f"📞 <b>Телефон:</b> {detail['tel'] or 'Не указан'}\n\n"
-        )
-
-        # Добавление списка товаров
-        order_text += "<b>🛒 Товары в заказе:</b>\n"
-        for idx, item in enumerate(detail['items'], start=1):
-            product = item['product']
-            order_text += (
-                f"{idx}. 🔹 <b>{product['name']}</b>\n"
-                f"    🆔 Артикул: {product['item_number']}\n"
-                f"    💰 Цена: {item['price']} ₽\n"
-                f"    📦 Количество: {item['quantity']} шт.\n"
-            )
-
-            # Разбивка по поставщикам
-            if 'product_supplier_info' in product and product['product_supplier_info']:
-                order_text += "    📊 Остатки у поставщиков:\n"
-                for supplier in product['product_supplier_info']:
-                    supplier_info = supplier.get('supplier_info', {})
-                    order_text += (
-                        f"        🔸 <b>{supplier_info.get('name', 'Неизвестный поставщик')}:</b>\n"
-                        f"           • Остаток: {supplier['quantity']} шт.\n"
-                        f"           • Цена поставки: {supplier['purchase_price']} ₽\n"
-                        f"           • Цена с наценкой: {supplier['extra_charge_price']} ₽\n"
-                    )
-            else:
-                order_text += "    ❌ Нет данных о поставщиках.\n"
-
-            order_text += "\n"
-
-        # Формирование клавиатуры
-        keyboard = InlineKeyboardMarkup()
-        keyboard.add(InlineKeyboardButton("🔗 Перейти к заказу", url=f"https://ass74.ru/order/{detail['unique_token']}"))
-
-        # Отправляем уведомления авторизованным пользователям
-        authorized_users = get_authorized_users()
-        async def send_notifications():
-            for user_id in authorized_users:
-                await bot.send_message(chat_id=user_id, text=order_text, reply_markup=keyboard, parse_mode="HTML")
-
-        asyncio.create_task(send_notifications())
+        # Сохраняем событие в очередь, рассылку выполнят воркеры.
+        # Повторная доставка того же заказа подтверждается без рассылки
+        key = event_key("order", order.get('detail', {}).get('id'), order)
+        if await outbox.enqueue("order", order, dedup_key=key) is None:
+            WEBHOOK_EVENTS.inc(kind="order", result="duplicate")
+            return web.json_response({"status": "success", "duplicate": True})
+        # Списки заказов изменились
+        api_client.invalidate_pages("orders")
+        try:
+            await order_index.add([order['detail']])
+        except Exception:
+            logging.exception("Не удалось добавить заказ в поисковый индекс")
+        WEBHOOK_EVENTS.inc(kind="order", result="accepted")
         return web.json_response({"status": "success"})
 
     except Exception as e:
+        WEBHOOK_EVENTS.inc(kind="order", result="error")
         return web.json_response({"error": str(e)}, status=500)
 
 # Вебхук для обратной связи
@@ -425,45 +317,216 @@ async def feedback_webhook(request):
     try:
         application = await request.json()
         if not application:
+            WEBHOOK_EVENTS.inc(kind="feedback", result="invalid")
             return web.json_response({"error": "Invalid data"}, status=400)
 
-        # Формируем сообщение
-        application_text = (
-            f"<b>📄 НОВАЯ ЗАЯВКА №{application['id']}</b>\n\n"
-            f"<b>Информация о заявке:</b>\n"
-            f"📝 <b>Статус:</b> {application['status']}\n"
-            f"📧 <b>Email:</b> {application['email'] or 'Не указан'}\n"
-            f"📞 <b>Телефон:</b> {application['tel'] or 'Не указан'}\n"
-            f"💬 <b>Комментарий:</b> {application['comment'] or 'Отсутствует'}\n"
-            f"📅 <b>Создана:</b> {application['created']}\n"
-        )
-
-        # Отправляем уведомления авторизованным пользователям
-        authorized_users = get_authorized_users()
-        async def send_notifications():
-            for user_id in authorized_users:
-                await bot.send_message(chat_id=user_id, text=application_text, parse_mode="HTML")
-
-        asyncio.create_task(send_notifications())
+        # Сохраняем событие в очередь, рассылку выполнят воркеры
+        key = event_key("feedback", application.get('id'), application)
+        if await outbox.enqueue("feedback", application, dedup_key=key) is None:
+            WEBHOOK_EVENTS.inc(kind="feedback", result="duplicate")
+            return web.json_response({"status": "success", "duplicate": True})
+        api_client.invalidate_pages("applications")
+        WEBHOOK_EVENTS.inc(kind="feedback", result="accepted")
         return web.json_response({"status": "success"})
 
     except Exception as e:
+        WEBHOOK_EVENTS.inc(kind="feedback", result="error")
         return web.json_response({"error": str(e)}, status=500)
 
+# Вебхук Telegram: обновления приходят push-запросами вместо long polling
+async def telegram_webhook(request):
+    """Принимает обновление Telegram и сразу отвечает; обработка идёт в фоне."""
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != TELEGRAM_WEBHOOK_SECRET:
+        return web.Response(status=403)
+    try:
+        update = types.Update(**await request.json())
+    except (ValueError, TypeError) as e:
+        # Отвечаем 200: на ошибку Telegram повторял бы то же тело снова
+        logging.warning("Некорректное обновление Telegram: %s", e)
+        return web.Response()
+    schedule_update(update)
+    return web.Response()
+
+def schedule_update(update: types.Update):
+    """Запускает обработку обновления в фоне; задача хранится до завершения."""
+    task = asyncio.create_task(process_telegram_update(update))
+    update_tasks.add(task)
+    task.add_done_callback(update_tasks.discard)
+
+async def process_telegram_update(update: types.Update):
+    """Обрабатывает обновление с ограничением числа одновременных обработчиков."""
+    async with updates_semaphore:
+        Bot.set_current(bot)
+        Dispatcher.set_current(dp)
+        try:
+            await dp.process_updates([update])
+        except Exception:
+            logging.exception("Ошибка обработки обновления %s", update.update_id)
+
+# Задачи обработки обновлений Telegram (вебхук или polling лидера)
+update_tasks = set()
+updates_semaphore = asyncio.Semaphore(UPDATES_CONCURRENCY)
+
+# Метрики в формате Prometheus
+async def metrics_handler(request):
+    """Отдаёт метрики бота."""
+    return web.Response(text=metrics_registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+register_cache("pages", api_client.page_cache)
+register_cache("details", api_client.detail_cache)
+register_cache("suppliers", api_client.catalog_cache)
+register_cache("render", render_cache)
+register_cache("dashboard", dashboard_cache)
+register_background("outbox_queue", lambda: outbox.queue.qsize())
+register_background("telegram_updates", lambda: len(update_tasks))
+register_background("prefetch", prefetcher.pending)
+register_background("dashboard_refresh", dashboard_cache.pending)
+
 # Добавление маршрутов вебхуков
 app.router.add_post('/webhook/orders', orders_webhook)
 app.router.add_post('/webhook/feedback', feedback_webhook)
+app.router.add_get('/metrics', metrics_handler)
+if TELEGRAM_WEBHOOK_ENABLED:
+    app.router.add_post(TELEGRAM_WEBHOOK_PATH, telegram_webhook)
+
+
+async def on_startup(dispatcher: Dispatcher):
+    """Запускает фоновые задачи бота."""
+    global users_watcher
+    await outbox.start(notifier, notification_recipients, is_silent=preference_index.is_silent)
+    if WORKERS > 1:
+        users_watcher = asyncio.create_task(watch_users())
+    leader.start()
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """Освобождает ресурсы при остановке бота."""
+    # Роль лидера сразу переходит к другому процессу
+    await leader.stop()
+    await outbox.stop()
+    if users_watcher is not None:
+        users_watcher.cancel()
+        await asyncio.gather(users_watcher, return_exceptions=True)
+    await api_client.close()
+    # Состояния FSM нужно записать до закрытия базы
+    await dispatcher.storage.close()
+    database.close()
+
+
+# Задача синхронизации пользователей между процессами
+users_watcher = None
+# Long polling в процессе-лидере (несколько процессов без вебхука)
+polling_task = None
+
+
+async def poll_updates(timeout: int = 20, error_sleep: float = 5):
+    """Long polling лидера; останавливается отменой задачи.
+
+    dp.start_polling рассчитан на один запуск за жизнь процесса, а лидером
+    процесс может становиться несколько раз. Обновления, получение которых
+    не подтверждено следующим запросом, Telegram отдаст следующему лидеру.
+    """
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            # Не больше, чем свободных мест для обработки (Telegram отдаёт до 100 за раз)
+            limit = min(100, UPDATES_CONCURRENCY - len(update_tasks))
+            updates = await bot.get_updates(offset=offset, limit=limit, timeout=timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception("Не удалось получить обновления")
+            await asyncio.sleep(error_sleep)
+            continue
+        if updates:
+            offset = updates[-1].update_id + 1
+            for update in updates:
+                schedule_update(update)
+        # Следующую пачку забираем, когда освободится место: остальное подождёт у Telegram
+        while len(update_tasks) >= UPDATES_CONCURRENCY:
+            await asyncio.wait(update_tasks, return_when=asyncio.FIRST_COMPLETED)
+
+
+async def start_leader_jobs():
+    """Задачи, которые выполняет только один процесс."""
+    global polling_task
+    api_client.token_refresher.start()
+    import_watcher.start(supplier_catalog)
+    order_index.start()
+    outbox.start_cleanup()
+    dashboard_cache.start(current_ranges)
+    if TELEGRAM_WEBHOOK_ENABLED:
+        # При смене лидера в работающем кластере накопленные обновления не сбрасываем
+        await bot.set_webhook(
+            TELEGRAM_WEBHOOK_URL + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET or None,
+            drop_pending_updates=WORKERS == 1,
+        )
+    elif WORKERS > 1:
+        polling_task = asyncio.create_task(poll_updates())
+
+
+async def stop_leader_jobs():
+    global polling_task
+    await api_client.token_refresher.stop()
+    await import_watcher.stop()
+    await order_index.stop()
+    await outbox.stop_cleanup()
+    await dashboard_cache.stop()
+    if polling_task is not None:
+        polling_task.cancel()
+        await asyncio.gather(polling_task, return_exceptions=True)
+        polling_task = None
+
+leader.on_elected(start_leader_jobs)
+leader.on_demoted(stop_leader_jobs)
+
+
+async def on_app_startup(web_app: web.Application):
+    """Запускает фоновые задачи, когда процессом управляет aiohttp (вебхук или несколько процессов)."""
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    await on_startup(dp)
+
+
+async def on_app_shutdown(web_app: web.Application):
+    """Дожидается обработки принятых обновлений и освобождает ресурсы."""
+    await asyncio.gather(*update_tasks, return_exceptions=True)
+    await on_shutdown(dp)
+    await (await bot.get_session()).close()
+
+
+def run_app(reuse_port: bool = False):
+    """Обновления Telegram (вебхук или polling лидера) и вебхуки сайта в одном aiohttp-сервере."""
+    app.on_startup.append(on_app_startup)
+    app.on_shutdown.append(on_app_shutdown)
+    web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT, reuse_port=reuse_port)
+
+
+def run_worker():
+    """Один из нескольких процессов бота на общем порту."""
+    logging.basicConfig(level=logging.INFO)
+    set_const_labels(worker=os.getpid())
+    run_app(reuse_port=True)
 
 
 # Основной запуск
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
+    if WORKERS > 1:
+        logging.basicConfig(level=logging.INFO)
+        supervise(run_worker, WORKERS)
+    elif TELEGRAM_WEBHOOK_ENABLED:
+        run_app()
+    else:
+        loop = asyncio.get_event_loop()
 
-    # Запуск aiohttp-сервера
-    runner = web.AppRunner(app)
-    loop.run_until_complete(runner.setup())
-    site = web.TCPSite(runner, "127.0.0.1", 5000)
-    loop.run_until_complete(site.start())
+        # Запуск aiohttp-сервера
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
+        loop.run_until_complete(site.start())
 
-    # Запуск Telegram-бота
-    executor.start_polling(dp, skip_updates=True, loop=loop)
\ No newline at end of file
+        # Запуск Telegram-бота
+        executor.start_polling(dp, skip_updates=True, loop=loop, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,160 @@
+"""Локальная заглушка API сайта (api.ass74.ru) для бенчмарков.
+
+Отвечает на все эндпоинты, которые использует APIClient, с настраиваемой
+задержкой и размером ответов.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from aiohttp import web
+
+SUPPLIERS = ("tochki", "brineks", "medved", "shininvest")
+
+
+def make_token(subject, ttl: float = 3600) -> str:
+    """JWT без подписи с полем exp — бот читает только срок действия."""
+    def _part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    return f"{_part({'alg': 'none', 'typ': 'JWT'})}.{_part({'sub': str(subject), 'exp': int(time.time() + ttl)})}.bench"
+
+
+def make_order(order_id: int, items: int, suppliers: int) -> dict:
+    return {
+        "id": order_id,
+        "status": {"status_name": "Создан"},
+        "total_price_with_discount": f"{order_id * 1000}.00",
+        "address": "Ул. 250-летия Чел., 44А, 69",
+        "first_name": "Андрей",
+        "last_name": "Хаметчин",
+        "patronymic": None,
+        "email": f"client{order_id}@mail.ru",
+        "tel": f"8963{order_id:07d}",
+        "unique_token": f"token-{order_id}",
+        "items": [
+            {
+                "price": "16012.70",
+                "quantity": 4,
+                "product": {
+                    "name": f"Ikon Tyres 235/60R18 107T XL Autograph Ice 9 SUV TL #{i}",
+                    "item_number": f"TS{order_id:05d}{i:02d}",
+                    "product_supplier_info": [
+                        {
+                            "supplier_info": {"name": SUPPLIERS[s % len(SUPPLIERS)]},
+                            "quantity": 12,
+                            "purchase_price": "12000.00",
+                            "extra_charge_price": "15600.00",
+                        }
+                        for s in range(suppliers)
+                    ],
+                },
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def make_application(application_id: int) -> dict:
+    return {
+        "id": application_id,
+        "status": "Новая",
+        "name": f"Клиент {application_id}",
+        "email": f"client{application_id}@mail.ru",
+        "tel": f"8963{application_id:07d}",
+        "comment": "Нужна консультация по шинам",
+        "created": "2024-11-20 12:00",
+    }
+
+
+def create_app(latency: float = 0.05, items: int = 5, suppliers: int = 3, page_size: int = 10,
+               total_pages: int = 20) -> web.Application:
+    """Создаёт приложение заглушки.
+
+    latency — задержка каждого ответа в секундах, items и suppliers — число
+    товаров в заказе и поставщиков у товара, page_size и total_pages —
+    размеры списков.
+    """
+    stats = {"requests": 0}
+    imports = {}
+
+    @web.middleware
+    async def delay(request, handler):
+        stats["requests"] += 1
+        await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def login(request):
+        response = web.json_response({"status": "ok"})
+        response.set_cookie("access_token", make_token("bench"))
+        response.set_cookie("refresh_token", make_token("bench", ttl=86400))
+        return response
+
+    async def refresh(request):
+        return web.json_response({"access_token": make_token("bench")})
+
+    def _page(request, make):
+        page = int(request.match_info["page"])
+        start = (page - 1) * page_size + 1
+        return web.json_response({
+            "data": [make(i) for i in range(start, start + page_size)],
+            "total_pages": total_pages,
+            "current_page": page,
+        })
+
+    async def order_list(request):
+        return _page(request, lambda i: make_order(i, 0, 0))
+
+    async def order_detail(request):
+        return web.json_response({"detail": make_order(int(request.match_info["id"]), items, suppliers)})
+
+    async def feedback_list(request):
+        return _page(request, make_application)
+
+    async def feedback_detail(request):
+        return web.json_response(make_application(int(request.match_info["id"])))
+
+    async def dashboard(request):
+        body = await request.json()
+        return web.json_response({"indicators": [
+            {"name": "Заказы", "value": 120}, {"name": "Выручка", "value": "1 250 000"},
+            {"name": "Период", "value": f"{body['date_in']} — {body['date_out']}"},
+        ]})
+
+    async def supplier_list(request):
+        return web.json_response([{"slug": slug, "name": slug} for slug in SUPPLIERS])
+
+    async def supplier_import(request):
+        body = await request.json()
+        if request.method == "PUT":
+            return web.json_response({"status": "ok", "extra_charge": body.get("extra_charge")})
+        data = {
+            "supplier_data": {"name": body["slug"], "extra_charge": 1.3},
+            "task_results": {
+                task: dict(result) for task, result in imports.setdefault(body["slug"], {
+                    "tire": {"last_status": "SUCCESS", "last_run_time": "2024-11-20 03:00"},
+                    "disk": {"last_status": "SUCCESS", "last_run_time": "2024-11-20 03:30"},
+                }).items()
+            },
+        }
+        # Условные запросы: неизменившийся ответ — пустой 304
+        etag = '"%s"' % hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(data, headers={"ETag": etag})
+
+    app = web.Application(middlewares=[delay])
+    app["stats"] = stats
+    # Статусы импорта по поставщикам: slug -> {задача: {last_status, last_run_time}}
+    app["imports"] = imports
+    app.router.add_post("/auth/token/", login)
+    app.router.add_post("/refresh", refresh)
+    app.router.add_get("/order/list/{page}/", order_list)
+    app.router.add_get("/order/detail/{id}/", order_detail)
+    app.router.add_get("/feedback/list/{page}/", feedback_list)
+    app.router.add_get("/feedback/request/{id}/", feedback_detail)
+    app.router.add_post("/settings_site/dashboard/", dashboard)
+    app.router.add_get("/product_import_manager/suppliers/", supplier_list)
+    app.router.add_route("*", "/product_import_manager/supplier_import/", supplier_import)
+    return app
@@ -0,0 +1,43 @@
+"""Локальная заглушка Telegram Bot API для бенчмарков.
+
+Принимает любые методы по адресу /bot<token>/<method>, отвечает с
+настраиваемой задержкой и считает вызовы по методам.
+"""
+import asyncio
+import time
+from collections import Counter
+from aiohttp import web
+
+# Методы, которые возвращают объект Message
+MESSAGE_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+
+def create_app(latency: float = 0.03) -> web.Application:
+    calls = Counter()
+    message_ids = iter(range(1, 10 ** 9))
+
+    async def handle(request):
+        method = request.match_info["method"]
+        data = dict(await request.post()) if request.body_exists else {}
+        await asyncio.sleep(latency)
+        calls[method] += 1
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method in MESSAGE_METHODS:
+            chat_id = int(data.get("chat_id") or 0)
+            result = {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            }
+        elif method == "getUpdates":
+            result = []
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app["calls"] = calls
+    app.router.add_post("/bot{token}/{method}", handle)
+    return app
@@ -0,0 +1,225 @@
+"""Нагрузочный стенд бота без внешних сервисов.
+
+Поднимает заглушки API сайта и Telegram Bot API, запускает приложение бота
+против них и прогоняет сценарии: пачку вебхуков о заказах, листание заказов
+несколькими пользователями и запросы статистики. Для каждого сценария
+печатает пропускную способность и задержки p50/p99.
+
+Запуск из корня репозитория:
+
+    python -m bench.run --users 20 --orders 200 --api-latency 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import tempfile
+import time
+
+from aiohttp import ClientSession, web
+
+from bench import fake_api, fake_telegram
+
+update_ids = itertools.count(1)
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def report(name: str, latencies, elapsed: float, extra: str = ""):
+    """Печатает строку отчёта по сценарию; задержки в секундах."""
+    count = len(latencies)
+    rate = count / elapsed if elapsed else 0.0
+    print(
+        f"{name:<16} n={count:<6} {rate:9.1f}/с  "
+        f"p50={percentile(latencies, 0.5) * 1000:8.1f}мс  p99={percentile(latencies, 0.99) * 1000:8.1f}мс  "
+        f"mean={(statistics.fmean(latencies) if latencies else 0) * 1000:8.1f}мс  {extra}"
+    )
+
+
+async def start_site(app: web.Application, port: int = 0):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", port)
+    await site.start()
+    return runner, runner.addresses[0][1]
+
+
+def callback_update(user_id: int, data: str):
+    from aiogram import types
+
+    return types.Update(**{
+        "update_id": next(update_ids),
+        "callback_query": {
+            "id": str(next(update_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "menu",
+            },
+        },
+    })
+
+
+async def process(bot_app, update) -> float:
+    """Прогоняет обновление через диспетчер вместе с middleware."""
+    started = time.perf_counter()
+    await bot_app.dp.process_updates([update])
+    return time.perf_counter() - started
+
+
+async def undelivered(bot_app) -> int:
+    """Сколько доставок ещё ждут отправки или сводки."""
+    row = await bot_app.database.fetchone(
+        "SELECT COUNT(*) FROM outbox_deliveries WHERE status IN ('pending', 'buffered')"
+    )
+    pending_events = await bot_app.database.fetchone("SELECT COUNT(*) FROM outbox_events WHERE status = 'pending'")
+    return row[0] + pending_events[0]
+
+
+async def webhook_burst(bot_app, base_url: str, telegram, users: int, orders: int, concurrency: int, args):
+    """Пачка вебхуков о новых заказах: время приёма и время до конца рассылки.
+
+    Рассылка считается законченной, когда в очереди не осталось
+    недоставленных событий (в режиме сводок сообщений меньше, чем событий).
+    """
+    calls = telegram["calls"]
+    sent_before = calls["sendMessage"]
+    semaphore = asyncio.Semaphore(concurrency)
+    offset = int(time.time())
+
+    async with ClientSession() as session:
+        async def send(i: int) -> float:
+            order = {"detail": fake_api.make_order(offset + i, args.items, args.suppliers)}
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(f"{base_url}/webhook/orders", json=order) as response:
+                    await response.read()
+                    assert response.status == 200, response.status
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(send(i) for i in range(orders)))
+        intake = time.perf_counter() - started
+        report("webhook intake", latencies, intake)
+
+        deadline = time.monotonic() + args.timeout
+        while await undelivered(bot_app) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        sent = calls["sendMessage"] - sent_before
+        print(f"{'fan-out':<16} {orders * users} доставок, {sent} сообщений за {elapsed:.2f}с "
+              f"({orders * users / elapsed:.1f} доставок/с)")
+
+
+async def paging(bot_app, users, pages: int):
+    """Каждый пользователь открывает заказы и листает страницы по очереди."""
+    async def walk(user_id: int):
+        result = [await process(bot_app, callback_update(user_id, "orders"))]
+        for page in range(2, pages + 1):
+            result.append(await process(bot_app, callback_update(user_id, f"orders_page:{page}")))
+        return result
+
+    started = time.perf_counter()
+    latencies = [value for walked in await asyncio.gather(*(walk(u) for u in users)) for value in walked]
+    report("orders paging", latencies, time.perf_counter() - started)
+
+
+async def stats_taps(bot_app, users, taps: int):
+    """Пользователи одновременно запрашивают статистику за текущий месяц."""
+    updates = [callback_update(user_id, "stats_range:current_month") for user_id in users for _ in range(taps)]
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(process(bot_app, update) for update in updates))
+    report("stats taps", latencies, time.perf_counter() - started)
+
+
+async def main(args):
+    api_runner, api_port = await start_site(
+        fake_api.create_app(args.api_latency, args.items, args.suppliers, args.page_size, args.pages)
+    )
+    telegram = fake_telegram.create_app(args.telegram_latency)
+    telegram_runner, telegram_port = await start_site(telegram)
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        # Имя хоста, а не IP: cookie-jar aiohttp не хранит куки для IP-адресов
+        "API_URL": f"http://localhost:{api_port}",
+        "TELEGRAM_API_SERVER": f"http://localhost:{telegram_port}",
+        "BOT_TOKEN": "123456:bench",
+        "DB_PATH": os.path.join(workdir, "bench.db"),
+        "PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "SLOW_UPDATES_LOG": os.path.join(workdir, "slow_updates.log"),
+        # Фоновые опросы сайта не должны попадать в замеры
+        "IMPORT_WATCH_INTERVAL": "0",
+        "ORDER_INDEX_BACKFILL_PAGES": "-1",
+    })
+    os.environ["DIGEST_WINDOW"] = str(args.digest_window)
+    if not args.real_limits:
+        os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "100000")
+        os.environ.setdefault("TELEGRAM_CHAT_INTERVAL", "0")
+
+    # Приложение читает настройки при импорте
+    import app as bot_app
+    from aiogram import Bot, Dispatcher
+    from utils.db import add_user
+
+    Bot.set_current(bot_app.bot)
+    Dispatcher.set_current(bot_app.dp)
+    users = list(range(100001, 100001 + args.users))
+    for user_id in users:
+        await add_user(user_id, fake_api.make_token(user_id), fake_api.make_token(user_id, ttl=86400))
+
+    runner, port = await start_site(bot_app.app)
+    await bot_app.on_startup(bot_app.dp)
+    print(f"users={args.users} api_latency={args.api_latency * 1000:.0f}мс "
+          f"telegram_latency={args.telegram_latency * 1000:.0f}мс items={args.items} suppliers={args.suppliers}")
+    try:
+        if "webhooks" in args.scenarios:
+            await webhook_burst(bot_app, f"http://localhost:{port}", telegram, args.users, args.orders,
+                                args.concurrency, args)
+        if "paging" in args.scenarios:
+            await paging(bot_app, users, args.pages)
+        if "stats" in args.scenarios:
+            await stats_taps(bot_app, users, args.taps)
+    finally:
+        await runner.cleanup()
+        await bot_app.on_shutdown(bot_app.dp)
+        await (await bot_app.bot.get_session()).close()
+        await telegram_runner.cleanup()
+        await api_runner.cleanup()
+
+    print(f"запросов к API: {api_runner.app['stats']['requests']}, "
+          f"вызовов Bot API: {sum(telegram['calls'].values())} {dict(telegram['calls'])}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный стенд бота на заглушках API сайта и Telegram")
+    parser.add_argument("--scenarios", nargs="+", default=["webhooks", "paging", "stats"],
+                        choices=["webhooks", "paging", "stats"])
+    parser.add_argument("--users", type=int, default=10, help="авторизованных пользователей")
+    parser.add_argument("--orders", type=int, default=100, help="вебхуков о заказах в пачке")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных вебхуков")
+    parser.add_argument("--pages", type=int, default=5, help="страниц заказов на пользователя")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--taps", type=int, default=3, help="запросов статистики на пользователя")
+    parser.add_argument("--items", type=int, default=5, help="товаров в заказе")
+    parser.add_argument("--suppliers", type=int, default=3, help="поставщиков у товара")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка API сайта, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="задержка Bot API, с")
+    parser.add_argument("--timeout", type=float, default=60, help="сколько ждать окончания рассылки, с")
+    parser.add_argument("--real-limits", action="store_true", help="не отключать лимиты рассылки Telegram")
+    parser.add_argument("--digest-window", type=float, default=0, help="окно сводок уведомлений, с (0 — выключены)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
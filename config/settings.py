@@ -2,4 +2,112 @@ import os
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "7811563217:AAHHGZ5l5g8Ur-IGaChoaN6MR0mqmAiCRW0")
 API_URL = os.getenv("API_URL", "https://api.ass74.ru")
-DB_PATH = "auth_users.db"
\ No newline at end of file
+# Адрес Bot API (локальный сервер или заглушка для бенчмарков); пусто — api.telegram.org
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")
+DB_PATH = os.getenv("DB_PATH", "auth_users.db")
+# Сколько миллисекунд SQLite ждёт снятия блокировки
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+
+# Пул HTTP-соединений к API сайта
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "100"))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "30"))
+
+# Рассылка уведомлений: параллельность и лимиты Telegram
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "20"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))  # сообщений в секунду на бота
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1"))  # секунд между сообщениями в один чат
+FANOUT_MAX_RETRIES = int(os.getenv("FANOUT_MAX_RETRIES", "3"))
+
+# Очередь событий вебхуков
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "30"))  # секунд
+# Сколько секунд событие закреплено за процессом, который его рассылает
+OUTBOX_CLAIM_TTL = float(os.getenv("OUTBOX_CLAIM_TTL", "60"))
+# Как часто искать события, брошенные остановившимися процессами
+OUTBOX_SWEEP_INTERVAL = float(os.getenv("OUTBOX_SWEEP_INTERVAL", "15"))
+# Сколько секунд хранить разосланные события; столько же работают кнопки «развернуть» в сводках
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 3600)))
+# Как часто удалять устаревшие события (только в процессе-лидере)
+OUTBOX_CLEANUP_INTERVAL = float(os.getenv("OUTBOX_CLEANUP_INTERVAL", "3600"))
+
+# Сводки: события, пришедшие получателю в течение окна после первого, уходят одним сообщением
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", "0"))  # секунд; 0 — каждое событие отдельным сообщением
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", "30"))  # строк в сводке
+DIGEST_MAX_BUTTONS = int(os.getenv("DIGEST_MAX_BUTTONS", "10"))  # кнопок «развернуть»
+
+# Часовой пояс тихих часов в настройках уведомлений
+NOTIFY_TIMEZONE = os.getenv("NOTIFY_TIMEZONE", "Asia/Yekaterinburg")
+
+# Сколько готовых текстов заказов и заявок хранить в памяти
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "256"))
+
+# Повторные доставки вебхуков с тем же содержимым игнорируются в течение окна
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "86400"))  # секунд
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))
+
+# Кэш страниц списков заказов и заявок
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "300"))  # секунд
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "1000"))
+
+# Кэш деталей заказов и заявок
+DETAIL_CACHE_TTL = float(os.getenv("DETAIL_CACHE_TTL", "120"))  # секунд
+DETAIL_CACHE_SIZE = int(os.getenv("DETAIL_CACHE_SIZE", "500"))
+
+# Каталог поставщиков с сайта; при недоступности используется встроенный список
+SUPPLIER_CATALOG_TTL = float(os.getenv("SUPPLIER_CATALOG_TTL", "3600"))  # секунд
+# Фоновая проверка импорта поставщиков: пока ничего не меняется, интервал растёт до максимального
+IMPORT_WATCH_INTERVAL = float(os.getenv("IMPORT_WATCH_INTERVAL", "60"))  # секунд; 0 — не проверять
+IMPORT_WATCH_MAX_INTERVAL = float(os.getenv("IMPORT_WATCH_MAX_INTERVAL", "900"))  # секунд
+
+# Локальный поиск заказов (/find): индекс пополняется вебхуками и обходом списка заказов
+ORDER_INDEX_BACKFILL_PAGES = int(os.getenv("ORDER_INDEX_BACKFILL_PAGES", "0"))  # 0 — все страницы, -1 — не обходить
+# Как часто повторять обход (новые страницы дочитываются до уже проиндексированных)
+ORDER_INDEX_BACKFILL_INTERVAL = float(os.getenv("ORDER_INDEX_BACKFILL_INTERVAL", "1800"))  # секунд
+FIND_RESULTS_LIMIT = int(os.getenv("FIND_RESULTS_LIMIT", "10"))
+
+# Предзагрузка следующей страницы и первых позиций списка
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+PREFETCH_DETAILS = int(os.getenv("PREFETCH_DETAILS", "3"))
+
+# Период фонового пересчёта статистики; более старые данные обновляются в фоне
+DASHBOARD_REFRESH_INTERVAL = float(os.getenv("DASHBOARD_REFRESH_INTERVAL", "900"))  # секунд
+
+# Обновлять access_token за столько секунд до истечения
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "120"))
+# Максимальный интервал между проверками сроков токенов
+TOKEN_CHECK_INTERVAL = float(os.getenv("TOKEN_CHECK_INTERVAL", "300"))
+
+# Адрес aiohttp-сервера вебхуков
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "127.0.0.1")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "5000"))
+
+# Режим вебхука Telegram вместо long polling
+TELEGRAM_WEBHOOK_ENABLED = os.getenv("TELEGRAM_WEBHOOK_ENABLED", "0") == "1"
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")  # публичный адрес сервера, например https://bot.ass74.ru
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/webhook/telegram")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+# Сколько обновлений Telegram обрабатывается одновременно
+UPDATES_CONCURRENCY = int(os.getenv("UPDATES_CONCURRENCY", "32"))
+
+# Несколько процессов на одном порту (SO_REUSEPORT) с общей базой SQLite
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Аренда роли лидера: лидер опрашивает Telegram и выполняет фоновые задачи в одном экземпляре
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "15"))  # секунд
+# Как часто проверять, не изменили ли пользователей другие процессы
+USERS_SYNC_INTERVAL = float(os.getenv("USERS_SYNC_INTERVAL", "1"))  # секунд
+
+# Хранилище состояний диалогов (FSM)
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "86400"))  # незаконченный диалог сбрасывается через сутки
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))  # секунд между записями на диск
+FSM_CACHE_IDLE = float(os.getenv("FSM_CACHE_IDLE", "600"))  # через сколько секунд простоя выгружать из памяти
+
+# Профилирование апдейтов
+SLOW_UPDATE_THRESHOLD = float(os.getenv("SLOW_UPDATE_THRESHOLD", "1"))  # секунд
+SLOW_UPDATES_LOG = os.getenv("SLOW_UPDATES_LOG", "slow_updates.log")
+SLOW_UPDATES_LOG_BYTES = int(os.getenv("SLOW_UPDATES_LOG_BYTES", str(10 * 1024 * 1024)))
+SLOW_UPDATES_LOG_BACKUPS = int(os.getenv("SLOW_UPDATES_LOG_BACKUPS", "5"))
+# Обработчики для выборочного профилирования через cProfile, через запятую
+PROFILE_HANDLERS = {name for name in os.getenv("PROFILE_HANDLERS", "").split(",") if name}
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
@@ -1,24 +1,25 @@
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram import Dispatcher
-from api.client import APIClient
-
-# Создаем API клиент
-api_client = APIClient()
+from functools import partial
+from api.client import api_client
+from config.settings import PREFETCH_DETAILS
+from utils.callbacks import callback_router, pack
+from utils.prefetch import prefetcher
+from utils.render import application_view
 
 async def show_applications(call: CallbackQuery):
     """Отображает список заявок (первая страница)."""
     await show_applications_page(call, 1)
 
-async def handle_applications_pagination(call: CallbackQuery):
+async def handle_applications_pagination(call: CallbackQuery, page: int):
     """Обрабатывает кнопки пагинации заявок."""
-    page = int(call.data.split("_")[-1])  # Извлекаем номер страницы из callback_data
     await show_applications_page(call, page)
 
 async def show_applications_page(call: CallbackQuery, page: int):
     """Отображает заявки для указанной страницы."""
     try:
         # Запрос к API
-        applications_response = api_client.get_applications(call.from_user.id, page)
+        applications_response = await api_client.get_applications(call.from_user.id, page)
         applications = applications_response.get("data", [])
         total_pages = applications_response.get("total_pages", 1)
         current_page = applications_response.get("current_page", 1)
@@ -32,15 +33,25 @@ async def show_applications_page(call: CallbackQuery, page: int):
         keyboard = InlineKeyboardMarkup()
         for application in applications:
             button_text = f"№{application['id']} | {application['status']} | {application['name']}"
-            keyboard.add(InlineKeyboardButton(button_text, callback_data=f"application_{application['id']}"))
+            keyboard.add(InlineKeyboardButton(button_text, callback_data=pack("application", application['id'])))
 
         # Добавляем кнопки пагинации
         if current_page > 1:
-            keyboard.add(InlineKeyboardButton("⬅️ Назад", callback_data=f"applications_page_{current_page - 1}"))
+            keyboard.add(InlineKeyboardButton("⬅️ Назад", callback_data=pack("applications_page", current_page - 1)))
         if current_page < total_pages:
-            keyboard.add(InlineKeyboardButton("➡️ Вперёд", callback_data=f"applications_page_{current_page + 1}"))
+            keyboard.add(InlineKeyboardButton("➡️ Вперёд", callback_data=pack("applications_page", current_page + 1)))
         keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data="back_to_main_menu"))
 
+        # Предзагружаем следующую страницу и первые заявки, пока пользователь читает список
+        user_id = call.from_user.id
+        fetches = [
+            partial(api_client.get_application_details, user_id, application['id'])
+            for application in applications[:PREFETCH_DETAILS]
+        ]
+        if current_page < total_pages:
+            fetches.append(partial(api_client.get_applications, user_id, current_page + 1))
+        prefetcher.schedule(user_id, fetches)
+
         # Обновляем сообщение
         await call.message.edit_text(f"📄 Заявки (страница {current_page} из {total_pages}):", reply_markup=keyboard)
         await call.answer()
@@ -48,30 +59,21 @@ async def show_applications_page(call: CallbackQuery, page: int):
         await call.message.edit_text(f"Произошла ошибка: {str(e)}")
         # Здесь замените на реальный вызов меню, если render_main_menu недоступен
 
-async def show_application_details(call: CallbackQuery):
+async def show_application_details(call: CallbackQuery, application_id: int):
     """Отображает детали выбранной заявки."""
-    application_id = int(call.data.split("_")[-1])
     try:
         # Получение информации о заявке
-        application = api_client.get_application_details(call.from_user.id, application_id)
+        application = await api_client.get_application_details(call.from_user.id, application_id)
         if not application:
             await call.message.edit_text("Информация о заявке не найдена.")
             return
 
         # Формирование информации о заявке
-        application_text = (
-            f"<b>📄 Заявка №{application['id']}</b>\n\n"
-            f"<b>Информация о заявке:</b>\n"
-            f"📝 <b>Статус:</b> {application['status']}\n"
-            f"📧 <b>Email:</b> {application['email'] or 'Не указан'}\n"
-            f"📞 <b>Телефон:</b> {application['tel'] or 'Не указан'}\n"
-            f"💬 <b>Комментарий:</b> {application['comment'] or 'Отсутствует'}\n"
-            f"📅 <b>Создана:</b> {application['created']}\n"
-        )
+        application_text = application_view(application)
 
         # Формирование клавиатуры
         keyboard = InlineKeyboardMarkup()
-        keyboard.add(InlineKeyboardButton("🔙 Назад к заявкам", callback_data=f"applications_page_1"))
+        keyboard.add(InlineKeyboardButton("🔙 Назад к заявкам", callback_data=pack("applications_page", 1)))
 
         # Отправка информации
         await call.message.edit_text(application_text, reply_markup=keyboard, parse_mode="HTML")
@@ -81,6 +83,6 @@ async def show_application_details(call: CallbackQuery):
 
 def register_handlers(dp: Dispatcher):
     """Регистрирует обработчики заявок."""
-    dp.register_callback_query_handler(show_applications, lambda call: call.data == "applications")
-    dp.register_callback_query_handler(handle_applications_pagination, lambda call: call.data.startswith("applications_page_"))
-    dp.register_callback_query_handler(show_application_details, lambda call: call.data.startswith("application_"))
\ No newline at end of file
+    callback_router.register("applications", show_applications)
+    callback_router.register("applications_page", handle_applications_pagination, int)
+    callback_router.register("application", show_application_details, int)
\ No newline at end of file
@@ -0,0 +1,32 @@
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from utils.db import is_user_authorized
+from utils.prefetch import prefetcher
+
+
+# Основное меню
+async def render_main_menu(message_or_call, user_id: int):
+    """Отображает главное меню с учётом авторизации."""
+    # Пользователь ушёл из списков: предзагрузка больше не нужна
+    prefetcher.cancel(user_id)
+    authorized = is_user_authorized(user_id)
+
+    keyboard = InlineKeyboardMarkup()
+    if authorized:
+        keyboard.add(InlineKeyboardButton("📊 Статистика", callback_data="stats"))
+        keyboard.add(InlineKeyboardButton("📦 Заказы", callback_data="orders"))
+        keyboard.add(InlineKeyboardButton("📄 Заявки", callback_data="applications"))
+        keyboard.add(InlineKeyboardButton("🏢 Поставщики", callback_data="suppliers"))
+        keyboard.add(InlineKeyboardButton("🔔 Уведомления", callback_data="notify_settings"))
+        keyboard.add(InlineKeyboardButton("🚪 Выход из системы", callback_data="logout"))
+        keyboard.add(InlineKeyboardButton("ℹ️ Помощь", callback_data="help"))
+        menu_message = "Вы авторизованы. Выберите действие:"
+    else:
+        keyboard.add(InlineKeyboardButton("🔑 Авторизация", callback_data="login"))
+        keyboard.add(InlineKeyboardButton("ℹ️ Помощь", callback_data="help"))
+        menu_message = "Вы не авторизованы. Пожалуйста, выполните авторизацию."
+
+    if isinstance(message_or_call, CallbackQuery):
+        await message_or_call.message.edit_text(menu_message, reply_markup=keyboard)
+        await message_or_call.answer()
+    elif isinstance(message_or_call, Message):
+        await message_or_call.answer(menu_message, reply_markup=keyboard)
@@ -0,0 +1,187 @@
+import re
+from aiogram import Dispatcher
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from handlers.suppliers import supplier_catalog
+from utils.callbacks import callback_router, pack
+from utils.db import set_preferences
+from utils.preferences import preference_index
+
+
+class NotificationSettingsStates(StatesGroup):
+    waiting_for_min_total = State()
+    waiting_for_quiet_hours = State()
+
+
+def _mark(enabled: bool) -> str:
+    return "✅" if enabled else "❌"
+
+
+def settings_text(telegram_id: int) -> str:
+    """Текст с текущими настройками уведомлений."""
+    prefs = preference_index.get(telegram_id)
+    suppliers = "все" if prefs.suppliers is None else (", ".join(sorted(prefs.suppliers)) or "ни одного")
+    min_total = f"от {prefs.min_total:g} ₽" if prefs.min_total else "любая"
+    if prefs.quiet_start is None:
+        quiet = "нет"
+    else:
+        quiet = f"с {prefs.quiet_start}:00 до {prefs.quiet_end}:00 (без звука)"
+    return (
+        "🔔 <b>Настройки уведомлений</b>\n"
+        f"{_mark(prefs.orders)} Новые заказы\n"
+        f"{_mark(prefs.feedback)} Обратная связь\n"
+        f"{_mark(prefs.imports)} Изменения импорта поставщиков\n"
+        f"🏢 Поставщики: {suppliers}\n"
+        f"💰 Сумма заказа: {min_total}\n"
+        f"🌙 Тихие часы: {quiet}"
+    )
+
+
+def settings_keyboard(telegram_id: int) -> InlineKeyboardMarkup:
+    prefs = preference_index.get(telegram_id)
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton(f"{_mark(prefs.orders)} Заказы", callback_data=pack("notify_toggle", "orders")))
+    keyboard.add(InlineKeyboardButton(f"{_mark(prefs.feedback)} Обратная связь", callback_data=pack("notify_toggle", "feedback")))
+    keyboard.add(InlineKeyboardButton(f"{_mark(prefs.imports)} Импорт поставщиков", callback_data=pack("notify_toggle", "imports")))
+    keyboard.add(InlineKeyboardButton("🏢 Поставщики", callback_data="notify_suppliers"))
+    keyboard.add(InlineKeyboardButton("💰 Минимальная сумма", callback_data="notify_min_total"))
+    keyboard.add(InlineKeyboardButton("🌙 Тихие часы", callback_data="notify_quiet"))
+    keyboard.add(InlineKeyboardButton("🔙 Назад", callback_data="back_to_main_menu"))
+    return keyboard
+
+
+# Меню настроек уведомлений
+async def show_notification_settings(call: CallbackQuery):
+    """Показывает текущие настройки уведомлений."""
+    await call.message.edit_text(
+        settings_text(call.from_user.id), reply_markup=settings_keyboard(call.from_user.id), parse_mode="HTML"
+    )
+    await call.answer()
+
+# Включение и выключение типов уведомлений
+async def toggle_notification(call: CallbackQuery, field: str):
+    """Переключает уведомления о заказах, обратной связи или импорте."""
+    if field not in ("orders", "feedback", "imports"):
+        await call.answer("Неизвестная настройка.")
+        return
+    prefs = preference_index.get(call.from_user.id)
+    await set_preferences(call.from_user.id, prefs._replace(**{field: not getattr(prefs, field)}))
+    await show_notification_settings(call)
+
+# Выбор поставщиков
+async def show_supplier_filter(call: CallbackQuery):
+    """Показывает список поставщиков, по которым приходят заказы."""
+    prefs = preference_index.get(call.from_user.id)
+    keyboard = InlineKeyboardMarkup()
+    for slug, name in (await supplier_catalog(call.from_user.id)).items():
+        selected = prefs.suppliers is None or name in prefs.suppliers
+        keyboard.add(InlineKeyboardButton(f"{_mark(selected)} {name}", callback_data=pack("notify_supplier", slug)))
+    keyboard.add(InlineKeyboardButton("🔄 Все поставщики", callback_data="notify_suppliers_all"))
+    keyboard.add(InlineKeyboardButton("🔙 Назад", callback_data="notify_settings"))
+    await call.message.edit_text(
+        "Уведомления о заказах приходят, если в заказе есть товар отмеченного поставщика; "
+        "оповещения об импорте — только по отмеченным поставщикам:",
+        reply_markup=keyboard
+    )
+    await call.answer()
+
+async def toggle_supplier(call: CallbackQuery, supplier_slug: str):
+    """Добавляет поставщика в фильтр или убирает из него."""
+    catalog = await supplier_catalog(call.from_user.id)
+    name = catalog.get(supplier_slug)
+    if name is None:
+        await call.answer("Неизвестный поставщик.")
+        return
+    prefs = preference_index.get(call.from_user.id)
+    selected = set(catalog.values()) if prefs.suppliers is None else set(prefs.suppliers)
+    selected ^= {name}
+    # Все отмеченные — то же, что без фильтра: новые поставщики тоже будут приходить
+    suppliers = None if selected >= set(catalog.values()) else frozenset(selected)
+    await set_preferences(call.from_user.id, prefs._replace(suppliers=suppliers))
+    await show_supplier_filter(call)
+
+async def reset_supplier_filter(call: CallbackQuery):
+    """Снимает фильтр по поставщикам."""
+    prefs = preference_index.get(call.from_user.id)
+    await set_preferences(call.from_user.id, prefs._replace(suppliers=None))
+    await show_supplier_filter(call)
+
+def cancel_keyboard() -> InlineKeyboardMarkup:
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("❌ Отменить", callback_data="notify_cancel"))
+    return keyboard
+
+# Минимальная сумма заказа
+async def edit_min_total_start(call: CallbackQuery):
+    """Предлагает ввести минимальную сумму заказа."""
+    await NotificationSettingsStates.waiting_for_min_total.set()
+    await call.message.edit_text(
+        "Введите минимальную сумму заказа в рублях, например 5000.\n"
+        "0 — уведомлять обо всех заказах.",
+        reply_markup=cancel_keyboard()
+    )
+    await call.answer()
+
+async def process_min_total_input(message: Message, state: FSMContext):
+    """Обрабатывает ввод минимальной суммы."""
+    value = message.text.strip()
+    if not re.match(r"^\d+(\.\d+|,\d+)?$", value):
+        await message.answer("Некорректное значение. Введите число, например 5000 или 0.")
+        return
+    prefs = preference_index.get(message.from_user.id)
+    await set_preferences(message.from_user.id, prefs._replace(min_total=float(value.replace(",", "."))))
+    await state.finish()
+    await message.answer(
+        settings_text(message.from_user.id), reply_markup=settings_keyboard(message.from_user.id), parse_mode="HTML"
+    )
+
+# Тихие часы
+async def edit_quiet_hours_start(call: CallbackQuery):
+    """Предлагает ввести тихие часы."""
+    await NotificationSettingsStates.waiting_for_quiet_hours.set()
+    await call.message.edit_text(
+        "Введите тихие часы в формате «начало-конец», например 23-8.\n"
+        "В это время уведомления приходят без звука. «нет» — отключить.",
+        reply_markup=cancel_keyboard()
+    )
+    await call.answer()
+
+async def process_quiet_hours_input(message: Message, state: FSMContext):
+    """Обрабатывает ввод тихих часов."""
+    value = message.text.strip().lower()
+    prefs = preference_index.get(message.from_user.id)
+    if value in ("0", "нет"):
+        prefs = prefs._replace(quiet_start=None, quiet_end=None)
+    else:
+        match = re.match(r"^(\d{1,2})\s*[-–]\s*(\d{1,2})$", value)
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 23 or match.group(1) == match.group(2):
+            await message.answer("Некорректное значение. Введите часы от 0 до 23, например 23-8, или «нет».")
+            return
+        prefs = prefs._replace(quiet_start=int(match.group(1)), quiet_end=int(match.group(2)))
+    await set_preferences(message.from_user.id, prefs)
+    await state.finish()
+    await message.answer(
+        settings_text(message.from_user.id), reply_markup=settings_keyboard(message.from_user.id), parse_mode="HTML"
+    )
+
+# Отмена ввода
+async def cancel_notification_edit(call: CallbackQuery, state: FSMContext):
+    """Отменяет ввод значения и возвращает к настройкам."""
+    await state.finish()
+    await show_notification_settings(call)
+
+def register_handlers(dp: Dispatcher):
+    callback_router.register("notify_settings", show_notification_settings)
+    callback_router.register("notify_toggle", toggle_notification, str)
+    callback_router.register("notify_suppliers", show_supplier_filter)
+    callback_router.register("notify_supplier", toggle_supplier, str)
+    callback_router.register("notify_suppliers_all", reset_supplier_filter)
+    callback_router.register("notify_min_total", edit_min_total_start)
+    callback_router.register("notify_quiet", edit_quiet_hours_start)
+    callback_router.register(
+        "notify_cancel", cancel_notification_edit,
+        state=[NotificationSettingsStates.waiting_for_min_total, NotificationSettingsStates.waiting_for_quiet_hours]
+    )
+    dp.register_message_handler(process_min_total_input, state=NotificationSettingsStates.waiting_for_min_total)
+    dp.register_message_handler(process_quiet_hours_input, state=NotificationSettingsStates.waiting_for_quiet_hours)
@@ -1,8 +1,14 @@
-from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram import Dispatcher
-from api.client import APIClient
-
-api_client = APIClient()
+from functools import partial
+from api.client import api_client
+from config.settings import PREFETCH_DETAILS
+from handlers.menu import render_main_menu
+from utils.callbacks import callback_router, pack
+from utils.db import is_user_authorized
+from utils.prefetch import prefetcher
+from utils.render import order_view
+from utils.search import order_index
 
 
 # Обработка кнопки “📦 Заказы”
@@ -11,9 +17,8 @@ async def show_orders(call: CallbackQuery):
     await show_orders_page(call, 1)
 
 # Обработка кнопки "Назад к заказам"
-async def handle_orders_pagination(call: CallbackQuery):
+async def handle_orders_pagination(call: CallbackQuery, page: int):
     """Обрабатывает кнопки пагинации заказов."""
-    page = int(call.data.split("_")[-1])  # Извлекаем номер страницы из callback_data
     await show_orders_page(call, page)  # Показываем указанную страницу
 
 # Получение и отображение заказов
@@ -21,7 +26,7 @@ async def show_orders_page(call: CallbackQuery, page: int):
     """Отображает заказы для указанной страницы."""
     try:
         # Запрос к API
-        orders_response = api_client.get_orders(call.from_user.id, page)
+        orders_response = await api_client.get_orders(call.from_user.id, page)
         orders = orders_response.get("data", [])
         total_pages = orders_response.get("total_pages", 1)
         current_page = orders_response.get("current_page", 1)
@@ -35,15 +40,22 @@ async def show_orders_page(call: CallbackQuery, page: int):
         keyboard = InlineKeyboardMarkup()
         for order in orders:
             button_text = f"№{order['id']} | {order['status']['status_name']} | {order['total_price_with_discount']} ₽"
-            keyboard.add(InlineKeyboardButton(button_text, callback_data=f"order_{order['id']}"))
+            keyboard.add(InlineKeyboardButton(button_text, callback_data=pack("order", order['id'])))
 
         # Добавляем кнопки пагинации
         if current_page > 1:
-            keyboard.add(InlineKeyboardButton("⬅️ Назад", callback_data=f"orders_page_{current_page - 1}"))
+            keyboard.add(InlineKeyboardButton("⬅️ Назад", callback_data=pack("orders_page", current_page - 1)))
         if current_page < total_pages:
-            keyboard.add(InlineKeyboardButton("➡️ Вперёд", callback_data=f"orders_page_{current_page + 1}"))
+            keyboard.add(InlineKeyboardButton("➡️ Вперёд", callback_data=pack("orders_page", current_page + 1)))
         keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data="back_to_main_menu"))
 
+        # Предзагружаем следующую страницу и первые заказы, пока пользователь читает список
+        user_id = call.from_user.id
+        fetches = [partial(api_client.get_order_details, user_id, order['id']) for order in orders[:PREFETCH_DETAILS]]
+        if current_page < total_pages:
+            fetches.append(partial(api_client.get_orders, user_id, current_page + 1))
+        prefetcher.schedule(user_id, fetches)
+
         # Обновляем сообщение
         await call.message.edit_text(f"📦 Заказы (страница {current_page} из {total_pages}):", reply_markup=keyboard)
         await call.answer()
@@ -54,63 +66,22 @@ async def show_orders_page(call: CallbackQuery, page: int):
 
 
 # Просмотр информации о заказе
-async def show_order_details(call: CallbackQuery):
+async def show_order_details(call: CallbackQuery, order_id: int):
     """Отображает детали выбранного заказа с товарами."""
-    order_id = int(call.data.split("_")[1])
     try:
         # Получение информации о заказе
-        order = api_client.get_order_details(call.from_user.id, order_id)
+        order = await api_client.get_order_details(call.from_user.id, order_id)
         if not order:
             await call.message.edit_text("Информация о заказе не найдена.")
             return
 
-        # Основная информация о заказе
         detail = order['detail']
-        order_text = (
-            f"<b>📦 Заказ №{detail['id']}</b>\n\n"
-            f"<b>Информация о заказе:</b>\n"
-            f"📝 <b>Статус:</b> {detail['status']['status_name']}\n"
-            f"💰 <b>Сумма:</b> {detail['total_price_with_discount']} ₽\n"
-            f"📦 <b>Количество товаров:</b> {sum(item['quantity'] for item in detail['items'])}\n"
-            f"📦 <b>Количество позиций:</b> {len(detail['items'])}\n"
-            f"📍 <b>Адрес доставки:</b> {detail['address'] or 'Не указан'}\n\n"
-            f"<b>Информация о клиенте:</b>\n"
-            f"👤 <b>Имя:</b> {detail['first_name']} {detail['last_name'] or ''} {detail['patronymic'] or ''}\n"
-            f"📧 <b>Email:</b> {detail['email'] or 'Не указан'}\n"
-            f"📞 <b>Телефон:</b> {detail['tel'] or 'Не указан'}\n\n"
-        )
-
-        # Добавление списка товаров
-        order_text += "<b>🛒 Товары в заказе:</b>\n"
-        for idx, item in enumerate(detail['items'], start=1):
-            product = item['product']
-            order_text += (
-                f"{idx}. 🔹 <b>{product['name']}</b>\n"
-                f"    🆔 Артикул: {product['item_number']}\n"
-                f"    💰 Цена: {item['price']} ₽\n"
-                f"    📦 Количество: {item['quantity']} шт.\n"
-            )
-
-            # Разбивка по поставщикам
-            if 'product_supplier_info' in product and product['product_supplier_info']:
-                order_text += "    📊 Остатки у поставщиков:\n"
-                for supplier in product['product_supplier_info']:
-                    supplier_info = supplier.get('supplier_info', {})
-                    order_text += (
-                        f"        🔸 <b>{supplier_info.get('name', 'Неизвестный поставщик')}:</b>\n"
-                        f"           • Остаток: {supplier['quantity']} шт.\n"
-                        f"           • Цена поставки: {supplier['purchase_price']} ₽\n"
-                        f"           • Цена с наценкой: {supplier['extra_charge_price']} ₽\n"
-                    )
-            else:
-                order_text += "    ❌ Нет данных о поставщиках.\n"
-
-            order_text += "\n"
+        order_text = order_view(detail)
 
         # Формирование клавиатуры
         keyboard = InlineKeyboardMarkup()
         keyboard.add(InlineKeyboardButton("🔗 Перейти к заказу", url=f"https://ass74.ru/order/{detail['unique_token']}"))
-        keyboard.add(InlineKeyboardButton("🔙 Назад к заказам", callback_data=f"orders_page_1"))
+        keyboard.add(InlineKeyboardButton("🔙 Назад к заказам", callback_data=pack("orders_page", 1)))
 
         # Отправка информации
         await call.message.edit_text(order_text, reply_markup=keyboard, parse_mode="HTML")
@@ -118,9 +89,35 @@ async def show_order_details(call: CallbackQuery):
     except Exception as e:
         await call.message.edit_text(f"Произошла ошибка: {str(e)}")
 
+# Команда /find
+async def find_orders(message: Message):
+    """Ищет заказы в локальном индексе: /find телефон, артикул, фамилия или номер."""
+    if not is_user_authorized(message.from_user.id):
+        await message.answer("Поиск доступен после авторизации. Введите /menu.")
+        return
+    query = message.get_args().strip()
+    if not query:
+        await message.answer(
+            "Укажите, что искать, например:\n"
+            "/find 8 963 000-00-01\n"
+            "/find TS0000101\n"
+            "/find Хаметчин"
+        )
+        return
+
+    results = await order_index.search(query)
+    if not results:
+        await message.answer("Заказы не найдены.")
+        return
+    keyboard = InlineKeyboardMarkup()
+    for order_id, summary in results:
+        keyboard.add(InlineKeyboardButton(summary, callback_data=pack("order", order_id)))
+    await message.answer(f"🔎 Найдено заказов: {len(results)}", reply_markup=keyboard)
+
 
 def register_handlers(dp: Dispatcher):
     """Регистрирует обработчики заказов."""
-    dp.register_callback_query_handler(show_orders, lambda call: call.data == "orders")
-    dp.register_callback_query_handler(handle_orders_pagination, lambda call: call.data.startswith("orders_page_"))
-    dp.register_callback_query_handler(show_order_details, lambda call: call.data.startswith("order_"))
\ No newline at end of file
+    callback_router.register("orders", show_orders)
+    callback_router.register("orders_page", handle_orders_pagination, int)
+    callback_router.register("order", show_order_details, int)
+    dp.register_message_handler(find_orders, commands=["find"])
\ No newline at end of file
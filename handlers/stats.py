@@ -1,19 +1,42 @@
 from aiogram import Dispatcher
-from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from api.client import APIClient
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
+from handlers.menu import render_main_menu
+from utils.callbacks import callback_router, pack
+from utils.dashboard import dashboard_cache
 
-api_client = APIClient()
+# Начало периода для каждого диапазона меню статистики
+STATS_RANGES = {
+    "current_month": lambda today: today.replace(day=1),
+    "last_2_months": lambda today: (today - timedelta(days=60)).replace(day=1),
+    "last_3_months": lambda today: (today - timedelta(days=90)).replace(day=1),
+    "last_6_months": lambda today: (today - timedelta(days=180)).replace(day=1),
+    "last_year": lambda today: today.replace(year=today.year - 1, day=1),
+}
+# Тяжёлые диапазоны считаются только в фоне
+BACKGROUND_ONLY_RANGES = {"last_year"}
+
+
+def stats_range(choice: str, today: datetime):
+    """Возвращает (date_in, date_out) для диапазона меню."""
+    start_date = STATS_RANGES[choice](today).strftime('%Y-%m-%d')
+    return start_date, today.strftime('%Y-%m-%d')
+
+
+def current_ranges():
+    """Все диапазоны меню статистики на сегодня."""
+    today = datetime.today()
+    return [stats_range(choice, today) for choice in STATS_RANGES]
 
 # Команда /stats
 async def show_stats_menu(message_or_call):
     """Показывает меню с диапазонами для статистики."""
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("📅 Текущий месяц", callback_data="current_month"))
-    keyboard.add(InlineKeyboardButton("📅 Последние 2 месяца", callback_data="last_2_months"))
-    keyboard.add(InlineKeyboardButton("📅 Последние 3 месяца", callback_data="last_3_months"))
-    keyboard.add(InlineKeyboardButton("📅 Последние 6 месяцев", callback_data="last_6_months"))
-    keyboard.add(InlineKeyboardButton("📅 За год", callback_data="last_year"))
+    keyboard.add(InlineKeyboardButton("📅 Текущий месяц", callback_data=pack("stats_range", "current_month")))
+    keyboard.add(InlineKeyboardButton("📅 Последние 2 месяца", callback_data=pack("stats_range", "last_2_months")))
+    keyboard.add(InlineKeyboardButton("📅 Последние 3 месяца", callback_data=pack("stats_range", "last_3_months")))
+    keyboard.add(InlineKeyboardButton("📅 Последние 6 месяцев", callback_data=pack("stats_range", "last_6_months")))
+    keyboard.add(InlineKeyboardButton("📅 За год", callback_data=pack("stats_range", "last_year")))
     keyboard.add(InlineKeyboardButton("🔙 Назад", callback_data="back_to_main_menu"))
 
     if isinstance(message_or_call, CallbackQuery):
@@ -23,31 +46,25 @@ async def show_stats_menu(message_or_call):
         await message_or_call.answer("Выберите временной диапазон для статистики:", reply_markup=keyboard)
 
 # Обработка диапазонов
-async def process_stats_choice(call: CallbackQuery):
+async def process_stats_choice(call: CallbackQuery, choice: str):
     """Обрабатывает выбор временного диапазона."""
-    choice = call.data
     today = datetime.today()
 
     # Определяем начальную и конечную даты на основе выбранного диапазона
-    if choice == "current_month":
-        start_date = today.replace(day=1).strftime('%Y-%m-%d')
-    elif choice == "last_2_months":
-        start_date = (today - timedelta(days=60)).replace(day=1).strftime('%Y-%m-%d')
-    elif choice == "last_3_months":
-        start_date = (today - timedelta(days=90)).replace(day=1).strftime('%Y-%m-%d')
-    elif choice == "last_6_months":
-        start_date = (today - timedelta(days=180)).replace(day=1).strftime('%Y-%m-%d')
-    elif choice == "last_year":
-        start_date = today.replace(year=today.year - 1, day=1).strftime('%Y-%m-%d')
-    else:
+    if choice not in STATS_RANGES:
         await call.message.answer("Неверный выбор. Попробуйте снова.")
         await call.answer()
         return
 
-    end_date = today.strftime('%Y-%m-%d')
+    start_date, end_date = stats_range(choice, today)
 
     try:
-        dashboard = api_client.get_dashboard(call.message.chat.id, start_date, end_date)
+        dashboard = await dashboard_cache.get(
+            call.message.chat.id, start_date, end_date, allow_fetch=choice not in BACKGROUND_ONLY_RANGES
+        )
+        if dashboard is None:
+            await call.answer("Статистика за этот период ещё готовится. Попробуйте через минуту.", show_alert=True)
+            return
         if not dashboard:
             await call.message.answer("Не удалось получить данные статистики. Попробуйте позже.")
             return
@@ -61,7 +78,6 @@ async def process_stats_choice(call: CallbackQuery):
         await call.message.delete()
         await call.message.answer(response)
 
-        from app import render_main_menu
         # Отображаем обновлённое меню
         await render_main_menu(call.message, call.from_user.id)
 
@@ -70,5 +86,5 @@ async def process_stats_choice(call: CallbackQuery):
         await call.answer()
 
 def register_handlers(dp: Dispatcher):
-    dp.register_callback_query_handler(show_stats_menu, lambda call: call.data == "stats")
-    dp.register_callback_query_handler(process_stats_choice, lambda call: call.data in ["current_month", "last_2_months", "last_3_months", "last_6_months", "last_year"])
\ No newline at end of file
+    callback_router.register("stats", show_stats_menu)
+    callback_router.register("stats_range", process_stats_choice, str)
\ No newline at end of file
@@ -0,0 +1,374 @@
+import asyncio
+import re
+from typing import Dict, Optional
+from aiogram import Dispatcher
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from api.client import api_client
+from handlers.menu import render_main_menu
+from utils.callbacks import callback_router, pack
+
+# Встроенный список поставщиков (slug -> название): на случай, если каталог на сайте недоступен
+DEFAULT_SUPPLIERS = {
+    "tochki": "4 точки",
+    "brineks": "Бринекс",
+    "medved": "Медведь",
+    "shininvest": "Шининвест",
+}
+# Краткие обозначения статусов импорта для сводной таблицы
+IMPORT_STATUS_ICONS = {"SUCCESS": "✅", "FAILURE": "❌", "STARTED": "⏳", "PENDING": "⏳"}
+
+
+async def supplier_catalog(telegram_id: int) -> Dict[str, str]:
+    """Каталог поставщиков с сайта (кэшируется в APIClient) или встроенный список."""
+    try:
+        return await api_client.get_suppliers(telegram_id) or DEFAULT_SUPPLIERS
+    except Exception:
+        return DEFAULT_SUPPLIERS
+
+
+# Обработка кнопки “📦 Поставщики”
+async def show_suppliers(call: CallbackQuery):
+    """Отображает список поставщиков."""
+    keyboard = InlineKeyboardMarkup()
+    for slug, name in (await supplier_catalog(call.from_user.id)).items():
+        keyboard.add(InlineKeyboardButton(name, callback_data=pack("supplier", slug)))
+    keyboard.add(InlineKeyboardButton("📊 Импорт всех поставщиков", callback_data="imports_overview"))
+    keyboard.add(InlineKeyboardButton("💰 Наценка для нескольких поставщиков", callback_data="bulk_extra_charge"))
+    keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data="back_to_main_menu"))
+    await call.message.edit_text("Выберите поставщика:", reply_markup=keyboard)
+    await call.answer()
+
+async def show_supplier_menu(call: CallbackQuery, supplier_slug: str):
+    """Отображает меню конкретного поставщика."""
+    supplier_name = (await supplier_catalog(call.from_user.id)).get(supplier_slug, "Неизвестный поставщик")
+
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("📄 Информация об импорте", callback_data=pack("import", supplier_slug)))
+    keyboard.add(InlineKeyboardButton("⚙️ Настройка", callback_data=pack("suppliersettings", supplier_slug)))
+    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщикам", callback_data="suppliers"))
+
+    await call.message.edit_text(f"Меню поставщика: {supplier_name}", reply_markup=keyboard)
+    await call.answer()
+
+async def show_import_info(call: CallbackQuery, supplier_slug: str):
+    """Отображает информацию об импорте поставщика."""
+    try:
+        import_data = await api_client.get_supplier_import(call.from_user.id, supplier_slug)
+        if not import_data:
+            await call.message.edit_text("Не удалось получить информацию об импорте. Попробуйте позже.")
+            return
+
+        supplier = import_data.get("supplier_data", {})
+        tasks = import_data.get("task_results", {})
+        tire_task = tasks.get("tire", {})
+        disk_task = tasks.get("disk", {})
+
+        import_text = (
+            f"<b>🏢 Поставщик:</b> {supplier.get('name')}\n"
+            f"<b>💰 Наценка:</b> {supplier.get('extra_charge')}\n\n"
+            f"<b>Последние импорты:</b>\n"
+            f"🔹 <b>Шины:</b> {tire_task.get('last_status', 'Нет данных')}\n"
+            f"   <b>Дата:</b> {tire_task.get('last_run_time', 'Нет данных')}\n"
+            f"🔹 <b>Диски:</b> {disk_task.get('last_status', 'Нет данных')}\n"
+            f"   <b>Дата:</b> {disk_task.get('last_run_time', 'Нет данных')}\n"
+        )
+
+        keyboard = InlineKeyboardMarkup()
+        keyboard.add(InlineKeyboardButton("🔙 Назад к поставщику", callback_data=pack("supplier", supplier_slug)))
+
+        await call.message.edit_text(import_text, reply_markup=keyboard, parse_mode="HTML")
+        await call.answer()
+    except Exception as e:
+        await call.message.edit_text(f"Произошла ошибка: {str(e)}")
+
+# Добавление состояния для настройки поставщика
+class SupplierSettingsStates(StatesGroup):
+    waiting_for_extra_charge = State()
+    waiting_for_bulk_extra_charge = State()
+
+
+def parse_extra_charge(value: str):
+    """Наценка из ввода пользователя («1.1» или «1,1»); None, если значение некорректно или меньше 1."""
+    value = value.strip()
+    if not re.match(r"^\d+(\.\d+|,\d+)?$", value) or float(value.replace(",", ".")) < 1:
+        return None
+    return float(value.replace(",", "."))
+
+# Переход в раздел "Настройка"
+async def supplier_settings(call: CallbackQuery, supplier_slug: str):
+    """Отображает раздел настройки поставщика."""
+    
+    # Новый текст сообщения с добавлением уникального элемента
+    new_text = (
+        f"Вы в разделе настройки поставщика: <b>{supplier_slug}</b>\n"
+        f"🔧 Здесь вы можете настроить параметры для этого поставщика."
+    )
+    
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("✏️ Изменить наценку", callback_data=pack("edit_extra_charge", supplier_slug)))
+    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщику", callback_data=pack("supplier", supplier_slug)))
+    
+    # Проверяем, нужно ли обновлять сообщение
+    if call.message.text != new_text or call.message.reply_markup != keyboard:
+        await call.message.edit_text(new_text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        await call.answer("Сообщение уже актуально.")  # Чтобы убрать "загрузка" в Telegram
+
+# Начало изменения наценки
+async def edit_extra_charge_start(call: CallbackQuery, supplier_slug: str, state: FSMContext):
+    """Предлагает ввести новую наценку."""
+    await state.set_state(SupplierSettingsStates.waiting_for_extra_charge)
+    # Сохраняем slug в состояние
+    async with state.proxy() as state_data:
+        state_data["supplier_slug"] = supplier_slug
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("❌ Отменить", callback_data="cancel_edit"))
+    await call.message.edit_text(
+        f"Введите новую наценку для поставщика {supplier_slug}.\n"
+        "Значение должно быть числом, не меньше 1. Например: 1.1 или 1,1.",
+        reply_markup=keyboard
+    )
+    await call.answer()
+
+# Обработка ввода наценки
+async def process_extra_charge_input(message: Message, state: FSMContext):
+    """Обрабатывает ввод наценки."""
+    # Проверяем корректность значения
+    extra_charge = parse_extra_charge(message.text)
+    if extra_charge is None:
+        await message.answer("Некорректное значение. Убедитесь, что вы ввели число больше или равное 1. Например: 1.1 или 1,1.")
+        return
+    
+    # Получаем slug из состояния
+    async with state.proxy() as state_data:
+        supplier_slug = state_data["supplier_slug"]
+
+    try:
+        # Отправляем изменения через API
+        response_data = await api_client.update_supplier_settings(message.from_user.id, supplier_slug, extra_charge)
+
+        # Проверяем ключ "status"
+        if response_data.get("status") == "error":
+            await message.answer(f"Не удалось обновить наценку. Ошибка: {response_data.get('message', 'Неизвестная ошибка')}")
+        else:
+            await message.answer(f"Наценка для поставщика {supplier_slug} успешно обновлена на {extra_charge}.")
+    except Exception as e:
+        await message.answer(f"Произошла ошибка: {str(e)}")
+    finally:
+        await state.finish()
+
+    # Возвращаемся в настройки поставщика
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщику", callback_data=pack("supplier", supplier_slug)))
+    await message.answer(f"Настройки для поставщика {supplier_slug} обновлены.", reply_markup=keyboard)
+    
+
+# Отмена изменения наценки
+async def cancel_edit(call: CallbackQuery, state: FSMContext):
+    """Отменяет изменение наценки."""
+    await state.finish()
+    await call.message.edit_text("Изменение наценки отменено.")
+    await call.answer()
+
+    # Отображаем обновлённое меню
+    await render_main_menu(call.message, call.from_user.id)
+
+
+def _status_icon(task: dict) -> str:
+    status = task.get("last_status")
+    return IMPORT_STATUS_ICONS.get(status, status or "—")
+
+async def fetch_imports(telegram_id: int, slugs) -> dict:
+    """Запрашивает статусы импорта всех поставщиков одновременно: slug -> данные или исключение."""
+    slugs = list(slugs)
+    results = await asyncio.gather(
+        *(api_client.get_supplier_import(telegram_id, slug) for slug in slugs), return_exceptions=True
+    )
+    return dict(zip(slugs, results))
+
+def render_imports_overview(catalog: Dict[str, str], imports: dict) -> str:
+    """Сводная таблица импорта по всем поставщикам."""
+    lines = ["<b>📊 Импорт поставщиков</b>", "<pre>", f"{'Поставщик':<14}{'Шины':<6}{'Диски':<6}Дата"]
+    for slug, name in catalog.items():
+        data = imports.get(slug)
+        if isinstance(data, BaseException) or not data:
+            lines.append(f"{name[:13]:<14}нет данных")
+            continue
+        tasks = data.get("task_results", {})
+        tire_task = tasks.get("tire", {})
+        disk_task = tasks.get("disk", {})
+        last_run = max(filter(None, (tire_task.get("last_run_time"), disk_task.get("last_run_time"))), default="—")
+        lines.append(f"{name[:13]:<14}{_status_icon(tire_task):<6}{_status_icon(disk_task):<6}{last_run}")
+    lines.append("</pre>")
+    return "\n".join(lines)
+
+# Сводка импорта по всем поставщикам
+async def show_imports_overview(call: CallbackQuery):
+    """Показывает статусы импорта всех поставщиков одной таблицей."""
+    catalog = await supplier_catalog(call.from_user.id)
+    try:
+        imports = await fetch_imports(call.from_user.id, catalog)
+    except Exception as e:
+        await call.message.edit_text(f"Произошла ошибка: {str(e)}")
+        return
+
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("🔄 Обновить", callback_data="imports_overview"))
+    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщикам", callback_data="suppliers"))
+    text = render_imports_overview(catalog, imports)
+    if call.message.text != text:
+        await call.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await call.answer()
+
+def parse_bulk_extra_charge(text: str, catalog: Dict[str, str]):
+    """Разбирает ввод массовой наценки: {slug: наценка} или текст ошибки.
+
+    Одно число — наценка для всех поставщиков каталога. Иначе каждая строка —
+    «поставщик значение», поставщик задаётся slug или названием.
+    """
+    value = parse_extra_charge(text)
+    if value is not None:
+        return {slug: value for slug in catalog}
+    by_name = {name.lower(): slug for slug, name in catalog.items()}
+    charges = {}
+    for line in filter(None, (line.strip() for line in text.splitlines())):
+        match = re.match(r"^(.+?)\s*[=:\s]\s*(\S+)$", line)
+        if not match:
+            return f"Не удалось разобрать строку «{line}»."
+        supplier, raw_value = match.group(1).strip().lower(), match.group(2)
+        slug = supplier if supplier in catalog else by_name.get(supplier)
+        if slug is None:
+            return f"Неизвестный поставщик «{match.group(1)}»."
+        value = parse_extra_charge(raw_value)
+        if value is None:
+            return f"Некорректная наценка для «{match.group(1)}»: {raw_value}."
+        charges[slug] = value
+    return charges or "Не указано ни одного поставщика."
+
+async def _put_extra_charges(telegram_id: int, charges: Dict[str, float]) -> Dict[str, Optional[str]]:
+    """Отправляет наценки одновременно: slug -> None при успехе или текст ошибки."""
+    slugs = list(charges)
+    results = await asyncio.gather(
+        *(api_client.update_supplier_settings(telegram_id, slug, charges[slug]) for slug in slugs),
+        return_exceptions=True
+    )
+    errors = {}
+    for slug, result in zip(slugs, results):
+        if isinstance(result, Exception):
+            errors[slug] = str(result)
+        elif result.get("status") == "error":
+            errors[slug] = result.get("message", "Неизвестная ошибка")
+        else:
+            errors[slug] = None
+    return errors
+
+async def bulk_update_extra_charge(telegram_id: int, charges: Dict[str, float], rollback: bool = False):
+    """Меняет наценку нескольких поставщиков одновременно.
+
+    При rollback предварительно читает текущие наценки (ещё один параллельный
+    запрос) и, если хотя бы одно изменение не прошло, возвращает прежние
+    значения успешно изменённым. Возвращает (ошибки по slug, откаченные slug).
+    """
+    previous = {}
+    if rollback:
+        imports = await fetch_imports(telegram_id, charges)
+        for slug, data in imports.items():
+            extra_charge = None if isinstance(data, BaseException) else data.get("supplier_data", {}).get("extra_charge")
+            if extra_charge is None:
+                # Без прежних значений откат невозможен: ничего не меняем
+                return {slug: "не удалось получить текущую наценку" for slug in charges}, set()
+            previous[slug] = float(extra_charge)
+
+    errors = await _put_extra_charges(telegram_id, charges)
+    rolled_back = set()
+    if rollback and any(errors.values()):
+        succeeded = {slug: previous[slug] for slug, error in errors.items() if error is None}
+        restored = await _put_extra_charges(telegram_id, succeeded)
+        rolled_back = {slug for slug, error in restored.items() if error is None}
+    return errors, rolled_back
+
+def render_bulk_report(catalog: Dict[str, str], charges: Dict[str, float], errors: Dict[str, Optional[str]],
+                       rolled_back) -> str:
+    """Итог массового изменения наценки по каждому поставщику."""
+    lines = ["<b>💰 Изменение наценки</b>"]
+    for slug, value in charges.items():
+        name = catalog.get(slug, slug)
+        if errors.get(slug):
+            lines.append(f"❌ {name}: {errors[slug]}")
+        elif slug in rolled_back:
+            lines.append(f"↩️ {name}: изменение отменено")
+        else:
+            lines.append(f"✅ {name}: {value}")
+    if rolled_back:
+        lines.append("\nЧасть изменений не прошла, успешные возвращены к прежним значениям.")
+    return "\n".join(lines)
+
+def bulk_prompt(rollback: bool):
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton(
+        f"{'✅' if rollback else '❌'} Откатить всё при ошибке", callback_data="bulk_extra_charge_rollback"
+    ))
+    keyboard.add(InlineKeyboardButton("❌ Отменить", callback_data="cancel_edit"))
+    text = (
+        "Введите наценку для всех поставщиков, например 1.2.\n"
+        "Или по поставщикам, по одному на строку:\n"
+        "<code>Бринекс 1.2\nmedved 1.15</code>\n"
+        "Значения — числа не меньше 1."
+    )
+    return text, keyboard
+
+# Массовое изменение наценки
+async def bulk_extra_charge_start(call: CallbackQuery, state: FSMContext):
+    """Предлагает ввести наценку для нескольких поставщиков."""
+    await state.set_state(SupplierSettingsStates.waiting_for_bulk_extra_charge)
+    await state.update_data(rollback=False)
+    text, keyboard = bulk_prompt(False)
+    await call.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await call.answer()
+
+async def toggle_bulk_rollback(call: CallbackQuery, state: FSMContext):
+    """Включает или выключает откат при частичной ошибке."""
+    async with state.proxy() as state_data:
+        state_data["rollback"] = not state_data.get("rollback", False)
+        rollback = state_data["rollback"]
+    text, keyboard = bulk_prompt(rollback)
+    await call.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await call.answer()
+
+async def process_bulk_extra_charge_input(message: Message, state: FSMContext):
+    """Обрабатывает ввод массовой наценки и отправляет изменения."""
+    catalog = await supplier_catalog(message.from_user.id)
+    charges = parse_bulk_extra_charge(message.text or "", catalog)
+    if isinstance(charges, str):
+        await message.answer(f"{charges} Попробуйте ещё раз.")
+        return
+    rollback = (await state.get_data()).get("rollback", False)
+    await state.finish()
+
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("🔙 Назад к поставщикам", callback_data="suppliers"))
+    try:
+        errors, rolled_back = await bulk_update_extra_charge(message.from_user.id, charges, rollback)
+    except Exception as e:
+        await message.answer(f"Произошла ошибка: {str(e)}", reply_markup=keyboard)
+        return
+    await message.answer(render_bulk_report(catalog, charges, errors, rolled_back),
+                         reply_markup=keyboard, parse_mode="HTML")
+
+def register_handlers(dp: Dispatcher):
+    """Регистрирует обработчики поставщиков."""
+    callback_router.register("suppliers", show_suppliers)
+    callback_router.register("supplier", show_supplier_menu, str)
+    callback_router.register("import", show_import_info, str)
+    callback_router.register("imports_overview", show_imports_overview)
+    callback_router.register("suppliersettings", supplier_settings, str)
+    callback_router.register("edit_extra_charge", edit_extra_charge_start, str)
+    callback_router.register("bulk_extra_charge", bulk_extra_charge_start)
+    callback_router.register("bulk_extra_charge_rollback", toggle_bulk_rollback,
+                             state=SupplierSettingsStates.waiting_for_bulk_extra_charge)
+    callback_router.register("cancel_edit", cancel_edit, state=SupplierSettingsStates.states)
+    dp.register_message_handler(process_extra_charge_input, state=SupplierSettingsStates.waiting_for_extra_charge)
+    dp.register_message_handler(process_bulk_extra_charge_input,
+                                state=SupplierSettingsStates.waiting_for_bulk_extra_charge)
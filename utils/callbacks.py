@@ -0,0 +1,122 @@
+import inspect
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from aiogram import Dispatcher
+from aiogram.dispatcher.filters.state import State
+from aiogram.dispatcher.handler import current_handler
+from aiogram.types import CallbackQuery
+
+# Формат callback_data: "действие:арг1:арг2"
+SEPARATOR = ":"
+# Ограничение Telegram на длину callback_data в байтах
+MAX_CALLBACK_DATA = 64
+
+
+def pack(action: str, *args) -> str:
+    """Собирает callback_data из действия и аргументов."""
+    parts = [action, *map(str, args)]
+    if any(SEPARATOR in part for part in parts[1:]):
+        raise ValueError(f"Аргумент callback_data не может содержать '{SEPARATOR}': {args}")
+    data = SEPARATOR.join(parts)
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA} байт: {data}")
+    return data
+
+
+class Route(NamedTuple):
+    handler: Callable[..., Awaitable]
+    arg_types: Tuple[type, ...]
+    # None — только без состояния FSM, "*" — в любом состоянии, иначе набор имён состояний
+    states: Optional[frozenset]
+    wants_state: bool
+
+
+class CallbackRouter:
+    """Таблица действий inline-кнопок.
+
+    Вместо цепочки фильтров по префиксам в диспетчере регистрируется один
+    обработчик: callback_data разбирается один раз, действие ищется в словаре,
+    аргументы приводятся к типам маршрута. Поиск не зависит от числа
+    обработчиков и порядка их регистрации.
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, Route] = {}
+
+    def register(self, action: str, handler: Callable[..., Awaitable], *arg_types: type, state=None):
+        """Регистрирует обработчик действия: handler(call, *args[, state]).
+
+        state работает как в aiogram: None — только вне состояний FSM,
+        "*" — в любом состоянии, State или список State — только в них.
+        """
+        if SEPARATOR in action:
+            raise ValueError(f"Действие не может содержать '{SEPARATOR}': {action}")
+        if action in self.routes:
+            raise ValueError(f"Действие уже зарегистрировано: {action}")
+        self.routes[action] = Route(
+            handler, arg_types, self._states(state), "state" in inspect.signature(handler).parameters
+        )
+
+    def route(self, action: str, *arg_types: type, state=None):
+        """Декоратор для register."""
+        def decorator(handler):
+            self.register(action, handler, *arg_types, state=state)
+            return handler
+        return decorator
+
+    @staticmethod
+    def _states(state) -> Optional[frozenset]:
+        if state is None or state == "*":
+            return state
+        if not isinstance(state, (list, tuple, set, frozenset)):
+            state = (state,)
+        return frozenset(item.state if isinstance(item, State) else item for item in state)
+
+    def resolve(self, data: str):
+        """Возвращает (маршрут, аргументы) или None, если callback_data не подходит."""
+        action, *raw_args = (data or "").split(SEPARATOR)
+        route = self.routes.get(action)
+        if route is None or len(raw_args) != len(route.arg_types):
+            return None
+        try:
+            args = tuple(arg_type(raw) for arg_type, raw in zip(route.arg_types, raw_args))
+        except ValueError:
+            return None
+        return route, args
+
+    async def _match(self, call: CallbackQuery):
+        """Фильтр диспетчера: разбирает callback_data и проверяет состояние FSM."""
+        resolved = self.resolve(call.data)
+        if resolved is None:
+            return False
+        route, args = resolved
+        data = {"callback_route": route, "callback_args": args}
+        if route.states == "*" and not route.wants_state:
+            return data
+        state = Dispatcher.get_current().current_state()
+        if route.states != "*":
+            raw_state = await state.get_state()
+            allowed = raw_state is None if route.states is None else raw_state in route.states
+            if not allowed:
+                return False
+        data["state"] = state
+        return data
+
+    @staticmethod
+    async def dispatch(call: CallbackQuery, callback_route: Route, callback_args: tuple, state=None):
+        """Вызывает обработчик найденного маршрута."""
+        if callback_route.wants_state:
+            return await callback_route.handler(call, *callback_args, state=state)
+        return await callback_route.handler(call, *callback_args)
+
+    def setup(self, dp: Dispatcher):
+        """Подключает таблицу к диспетчеру одним обработчиком."""
+        dp.register_callback_query_handler(self.dispatch, self._match, state="*")
+
+
+def handler_name(data: dict) -> str:
+    """Имя обработчика апдейта; для inline-кнопок — обработчик из таблицы действий."""
+    route = data.get("callback_route")
+    return (route.handler if route is not None else current_handler.get()).__name__
+
+
+callback_router = CallbackRouter()
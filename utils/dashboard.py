@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from api.client import APIClient, api_client
+from config.settings import DASHBOARD_REFRESH_INTERVAL
+from utils.db import get_authorized_users
+from utils.profiling import track, untracked
+
+log = logging.getLogger(__name__)
+
+Range = Tuple[str, str]
+
+
+class DashboardCache:
+    """Общий кэш дашборда по ключу (date_in, date_out).
+
+    Данные одинаковы для всех пользователей, поэтому запрос к сайту делается
+    один раз на диапазон. Устаревшая запись отдаётся сразу, а обновляется в
+    фоне (stale-while-revalidate); фоновая задача периодически пересчитывает
+    все диапазоны меню статистики.
+    """
+
+    def __init__(self, client: APIClient, refresh_interval: float = DASHBOARD_REFRESH_INTERVAL):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        # (date_in, date_out) -> (время загрузки, данные)
+        self._items: Dict[Range, Tuple[float, dict]] = {}
+        self._refreshing: Dict[Range, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, telegram_id: int, date_in: str, date_out: str, allow_fetch: bool = True) -> Optional[dict]:
+        """Возвращает дашборд за период.
+
+        Если данных нет и allow_fetch=False, запускает расчёт в фоне и возвращает None.
+        """
+        key = (date_in, date_out)
+        item = self._items.get(key)
+        if item is not None:
+            self.hits += 1
+            if time.monotonic() - item[0] > self.refresh_interval:
+                self.refresh(key, telegram_id)
+            return item[1]
+        self.misses += 1
+        task = self.refresh(key, telegram_id)
+        if not allow_fetch:
+            return None
+        with track("api"):
+            return await asyncio.shield(task)
+
+    def pending(self) -> int:
+        """Число идущих обновлений."""
+        return len(self._refreshing)
+
+    def refresh(self, key: Range, telegram_id: int) -> asyncio.Task:
+        """Запускает обновление диапазона; повторный вызов вернёт уже идущее обновление."""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(untracked(self._load(key, telegram_id)))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda task: self._done(key, task))
+        return task
+
+    def _done(self, key: Range, task: asyncio.Task):
+        self._refreshing.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("Не удалось обновить дашборд %s: %s", key, task.exception())
+
+    async def _load(self, key: Range, telegram_id: int) -> dict:
+        data = await self.client.get_dashboard(telegram_id, *key)
+        if data:
+            self._items[key] = (time.monotonic(), data)
+        return data
+
+    async def refresh_all(self, ranges: Iterable[Range]):
+        """Пересчитывает все диапазоны от имени любого авторизованного пользователя.
+
+        Если запрос от имени пользователя не удался (например, его токен
+        отозван), диапазон запрашивается от имени следующего.
+        """
+        ranges = list(ranges)
+        # Диапазоны прошлых дней больше не запрашиваются
+        for key in [key for key in self._items if key not in ranges]:
+            del self._items[key]
+        users = list(get_authorized_users())
+        for key in ranges:
+            for index, telegram_id in enumerate(users):
+                try:
+                    await self.refresh(key, telegram_id)
+                except Exception:
+                    # Ошибку уже записал _done
+                    continue
+                # Следующие диапазоны начинаем с пользователя, от имени которого получилось
+                users = users[index:] + users[:index]
+                break
+
+    def start(self, ranges: Callable[[], Iterable[Range]]):
+        """Запускает периодическое обновление диапазонов, которые возвращает ranges()."""
+        async def _loop():
+            while True:
+                await self.refresh_all(ranges())
+                await asyncio.sleep(self.refresh_interval)
+
+        self._task = asyncio.create_task(_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Общий кэш дашборда
+dashboard_cache = DashboardCache(api_client)
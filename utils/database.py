@@ -0,0 +1,126 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+from config.settings import DB_PATH, DB_BUSY_TIMEOUT
+from utils.profiling import track, untracked
+
+# Настройки соединения: WAL позволяет читать во время записи,
+# busy_timeout ждёт освобождения блокировки вместо "database is locked"
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class Database:
+    """Долгоживущее соединение с SQLite в отдельном потоке.
+
+    Все запросы выполняются в одном выделенном потоке, поэтому не блокируют
+    цикл событий. Записи, пришедшие одновременно, фиксируются одной транзакцией.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, tuple, asyncio.Future]] = []
+        self._flush_scheduled = False
+        # Задачи записи пачек: ссылка нужна, чтобы задачу не собрал сборщик мусора
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Вызывается только из потока базы данных
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            for pragma in PRAGMAS:
+                self._conn.execute(pragma)
+        return self._conn
+
+    def _call(self, fn: Callable, args: tuple):
+        return fn(self._connection(), *args)
+
+    def run_sync(self, fn: Callable[..., Any], *args):
+        """Выполняет fn(conn, *args) в потоке базы и ждёт результат (для кода вне цикла событий)."""
+        return self._executor.submit(self._call, fn, args).result()
+
+    async def run(self, fn: Callable[..., Any], *args):
+        """Выполняет fn(conn, *args) в потоке базы, не блокируя цикл событий."""
+        loop = asyncio.get_running_loop()
+        with track("db"):
+            return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    async def fetchone(self, sql: str, params: tuple = ()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: tuple = ()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[tuple]):
+        """Пакетная запись в одной транзакции."""
+        rows = list(seq_of_params)
+
+        def _executemany(conn):
+            with conn:
+                conn.executemany(sql, rows)
+
+        await self.run(_executemany)
+
+    async def execute(self, sql: str, params: tuple = ()):
+        """Запись; одновременные вызовы объединяются в одну транзакцию."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((sql, params, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._start_flush)
+        with track("db"):
+            return await future
+
+    def _start_flush(self):
+        task = asyncio.ensure_future(untracked(self._flush()))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        self._flush_scheduled = False
+
+        def _write_batch(conn):
+            results = []
+            with conn:
+                for sql, params, _ in batch:
+                    try:
+                        results.append((True, conn.execute(sql, params).rowcount))
+                    except sqlite3.Error as e:
+                        results.append((False, e))
+            return results
+
+        try:
+            results = await self.run(_write_batch)
+        except Exception as e:
+            results = [(False, e)] * len(batch)
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self):
+        """Закрывает соединение и поток базы."""
+        def _close(conn):
+            conn.close()
+
+        if self._conn is not None:
+            self.run_sync(_close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+
+# Общее соединение с базой пользователей
+database = Database(DB_PATH)
@@ -1,59 +1,123 @@
-import sqlite3
-from config.settings import DB_PATH
-# Путь к базе данных
-# DB_PATH = "auth_users.db"
+import asyncio
+import logging
+from config.settings import USERS_SYNC_INTERVAL
+from utils.database import database
+from utils.preferences import Preferences, preference_index
+from utils.registry import user_registry
 
-# Создаем подключение и таблицу, если она не существует
+log = logging.getLogger(__name__)
+# PRAGMA data_version на момент последней загрузки реестра
+_data_version = None
+
+USERS_QUERY = "SELECT telegram_id, is_authorized, access_token, refresh_token FROM users"
+PREFERENCES_QUERY = """
+    SELECT telegram_id, orders, feedback, imports, suppliers, min_total, quiet_start, quiet_end FROM notification_prefs
+"""
+
+# Создаем таблицу, если она не существует, и загружаем пользователей
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            telegram_id INTEGER UNIQUE NOT NULL,
-            is_authorized INTEGER NOT NULL,
-            access_token TEXT,
-            refresh_token TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    def _init(conn):
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    telegram_id INTEGER UNIQUE NOT NULL,
+                    is_authorized INTEGER NOT NULL,
+                    access_token TEXT,
+                    refresh_token TEXT
+                )
+            """)
+            # Настройки уведомлений; пользователя без строки уведомляем обо всём
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS notification_prefs (
+                    telegram_id INTEGER PRIMARY KEY,
+                    orders INTEGER NOT NULL DEFAULT 1,
+                    feedback INTEGER NOT NULL DEFAULT 1,
+                    imports INTEGER NOT NULL DEFAULT 0,
+                    suppliers TEXT,
+                    min_total REAL NOT NULL DEFAULT 0,
+                    quiet_start INTEGER,
+                    quiet_end INTEGER
+                )
+            """)
+            # Таблицы, созданные до появления подписки на импорт
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(notification_prefs)")}
+            if "imports" not in columns:
+                conn.execute("ALTER TABLE notification_prefs ADD COLUMN imports INTEGER NOT NULL DEFAULT 0")
+        return conn.execute(USERS_QUERY).fetchall(), conn.execute(PREFERENCES_QUERY).fetchall()
+
+    # Загружаем пользователей и их настройки в память: дальше чтения идут только оттуда
+    users, preferences = database.run_sync(_init)
+    user_registry.load(users)
+    preference_index.load(preferences)
+
+async def sync_users():
+    """Перечитывает пользователей, если базу с тех пор изменил другой процесс.
+
+    PRAGMA data_version меняется только после чужих транзакций, поэтому
+    без изменений проверка стоит одного лёгкого запроса.
+    """
+    global _data_version
+
+    def _read(conn):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == _data_version:
+            return version, None, None
+        return version, conn.execute(USERS_QUERY).fetchall(), conn.execute(PREFERENCES_QUERY).fetchall()
+
+    version, users, preferences = await database.run(_read)
+    if users is not None:
+        user_registry.load(users)
+        preference_index.load(preferences)
+        _data_version = version
+
+async def watch_users(interval: float = USERS_SYNC_INTERVAL):
+    """Периодически подхватывает входы, выходы, новые токены и настройки из других процессов."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_users()
+        except Exception:
+            log.exception("Не удалось перечитать пользователей")
 
 def get_authorized_users():
     """Возвращает список Telegram ID всех авторизованных пользователей."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT telegram_id FROM users WHERE is_authorized = 1")
-    users = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return users
+    return user_registry.authorized_ids()
 
 
 # Добавление пользователя
-def add_user(telegram_id: int, access_token: str, refresh_token: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+async def add_user(telegram_id: int, access_token: str, refresh_token: str):
+    await database.execute("""
         INSERT OR REPLACE INTO users (telegram_id, is_authorized, access_token, refresh_token)
         VALUES (?, ?, ?, ?)
     """, (telegram_id, 1, access_token, refresh_token))
-    conn.commit()
-    conn.close()
+    user_registry.set_user(telegram_id, access_token, refresh_token)
 
 # Удаление пользователя
-def remove_user(telegram_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
-    conn.commit()
-    conn.close()
+async def remove_user(telegram_id: int):
+    await database.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
+    user_registry.remove(telegram_id)
+
+# Обновление access_token после refresh
+async def update_access_token(telegram_id: int, access_token: str):
+    await database.execute("UPDATE users SET access_token = ? WHERE telegram_id = ?", (access_token, telegram_id))
+    user_registry.set_access_token(telegram_id, access_token)
+
+# Сохранение настроек уведомлений
+async def set_preferences(telegram_id: int, prefs: Preferences):
+    suppliers = "\n".join(sorted(prefs.suppliers)) if prefs.suppliers is not None else None
+    await database.execute("""
+        INSERT OR REPLACE INTO notification_prefs
+            (telegram_id, orders, feedback, imports, suppliers, min_total, quiet_start, quiet_end)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (telegram_id, int(prefs.orders), int(prefs.feedback), int(prefs.imports), suppliers, prefs.min_total,
+          prefs.quiet_start, prefs.quiet_end))
+    preference_index.set(telegram_id, prefs)
+
+# Получатели уведомления о событии с учётом настроек
+def get_notification_recipients(kind: str, payload: dict):
+    return preference_index.recipients(kind, payload, user_registry.authorized_ids())
 
 # Проверка авторизации пользователя
 def is_user_authorized(telegram_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT is_authorized FROM users WHERE telegram_id = ?", (telegram_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None and result[0] == 1
-
+    return user_registry.is_authorized(telegram_id)
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional
+from config.settings import DEDUP_WINDOW, DEDUP_MAX_ENTRIES
+from utils.database import Database
+
+# Старые ключи удаляются из таблицы раз в столько записей, а не при каждом вебхуке
+PRUNE_EVERY = 100
+
+
+def event_key(kind: str, entity_id, payload: dict) -> str:
+    """Ключ события: тип, id сущности и хэш содержимого."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return f"{kind}:{entity_id}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+class DedupIndex:
+    """Ограниченное по времени и размеру окно уже принятых событий вебхуков.
+
+    Быстрая проверка идёт по памяти процесса. Окончательное решение
+    принимает таблица webhook_dedup: она переживает перезапуск и общая для
+    всех процессов. Запись в таблицу делает Outbox в той же транзакции,
+    что и сохранение события.
+    """
+
+    def __init__(self, db: Database, window: float = DEDUP_WINDOW, maxsize: int = DEDUP_MAX_ENTRIES):
+        self.db = db
+        self.window = window
+        self.maxsize = maxsize
+        # key -> время получения, в порядке поступления
+        self._keys: "OrderedDict[str, float]" = OrderedDict()
+        self._records = 0
+
+    def init(self):
+        """Создаёт таблицу и загружает ключи, не вышедшие из окна."""
+        def _init(conn):
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS webhook_dedup (
+                        key TEXT PRIMARY KEY,
+                        received_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS webhook_dedup_received_at ON webhook_dedup (received_at)")
+                conn.execute("DELETE FROM webhook_dedup WHERE received_at < ?", (time.time() - self.window,))
+            return conn.execute(
+                "SELECT key, received_at FROM webhook_dedup ORDER BY received_at DESC LIMIT ?", (self.maxsize,)
+            ).fetchall()
+
+        self._keys = OrderedDict(reversed(self.db.run_sync(_init)))
+
+    def _prune(self, now: float):
+        while self._keys:
+            key, received_at = next(iter(self._keys.items()))
+            if received_at >= now - self.window and len(self._keys) <= self.maxsize:
+                break
+            self._keys.popitem(last=False)
+
+    def add(self, key: str) -> bool:
+        """Запоминает ключ. Возвращает False, если событие уже принималось."""
+        now = time.time()
+        self._prune(now)
+        if key in self._keys:
+            return False
+        self._keys[key] = now
+        return True
+
+    def discard(self, key: str):
+        self._keys.pop(key, None)
+
+    def record(self, conn: sqlite3.Connection, key: Optional[str]) -> bool:
+        """Сохраняет ключ в таблицу (вызывается в потоке базы внутри транзакции).
+
+        Возвращает False, если ключ в пределах окна уже записал другой процесс.
+        """
+        if key is None:
+            return True
+        now = self._keys.get(key, time.time())
+        self._records += 1
+        if self._records % PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM webhook_dedup WHERE received_at < ?", (now - self.window,))
+        # Ключ, вышедший из окна, но ещё не удалённый, считается новым
+        cursor = conn.execute("""
+            INSERT INTO webhook_dedup (key, received_at) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET received_at = excluded.received_at
+            WHERE webhook_dedup.received_at < ?
+        """, (key, now, now - self.window))
+        return cursor.rowcount == 1
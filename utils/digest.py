@@ -0,0 +1,108 @@
+import time
+from typing import List, Optional, Tuple
+from config.settings import DIGEST_WINDOW
+from utils.database import Database
+
+
+class DigestBuffer:
+    """Окна сводок уведомлений по получателям (таблица digest_windows).
+
+    Первое событие для получателя уходит сразу и открывает окно. События,
+    пришедшие, пока окно открыто, помечаются в outbox_deliveries как
+    'buffered' и по истечении окна отправляются одной сводкой; после
+    сводки окно открывается снова. Если за окно ничего не накопилось,
+    оно закрывается, и следующее событие снова уйдёт сразу.
+
+    Все решения принимаются одной транзакцией SQLite, поэтому окна общие
+    для всех процессов бота.
+    """
+
+    def __init__(self, db: Database, window: float = DIGEST_WINDOW):
+        self.db = db
+        self.window = window
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def init(self):
+        """Создаёт таблицу окон."""
+        def _init(conn):
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS digest_windows (
+                        chat_id INTEGER PRIMARY KEY,
+                        flush_at REAL NOT NULL
+                    )
+                """)
+
+        self.db.run_sync(_init)
+
+    async def buffer(self, event_id: int, chat_id: int) -> bool:
+        """Откладывает доставку в сводку, если окно получателя открыто.
+
+        False — окна не было: оно открыто сейчас, сообщение нужно отправить сразу.
+        """
+        def _buffer(conn):
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO digest_windows (chat_id, flush_at) VALUES (?, ?)",
+                    (chat_id, time.time() + self.window)
+                )
+                if cursor.rowcount == 1:
+                    return False
+                conn.execute(
+                    "UPDATE outbox_deliveries SET status = 'buffered' WHERE event_id = ? AND chat_id = ?",
+                    (event_id, chat_id)
+                )
+                return True
+
+        return await self.db.run(_buffer)
+
+    async def due(self) -> List[Tuple[int, float]]:
+        """Окна, которые пора закрыть: (chat_id, flush_at)."""
+        return await self.db.fetchall(
+            "SELECT chat_id, flush_at FROM digest_windows WHERE flush_at <= ?", (time.time(),)
+        )
+
+    async def claim(self, chat_id: int, flush_at: float) -> Optional[List[Tuple[int, str, str]]]:
+        """Забирает накопленные события получателя: [(event_id, kind, payload)].
+
+        Окно сдвигается на следующий период, поэтому сводку отправляет только
+        один процесс. None — окно уже обработал другой процесс или событий нет
+        (тогда окно закрывается).
+        """
+        def _claim(conn):
+            with conn:
+                next_flush = time.time() + self.window
+                cursor = conn.execute(
+                    "UPDATE digest_windows SET flush_at = ? WHERE chat_id = ? AND flush_at = ?",
+                    (next_flush, chat_id, flush_at)
+                )
+                if cursor.rowcount != 1:
+                    return None
+                items = conn.execute("""
+                    SELECT e.id, e.kind, e.payload FROM outbox_deliveries d
+                    JOIN outbox_events e ON e.id = d.event_id
+                    WHERE d.chat_id = ? AND d.status = 'buffered'
+                    ORDER BY e.id
+                """, (chat_id,)).fetchall()
+                if not items:
+                    conn.execute("DELETE FROM digest_windows WHERE chat_id = ?", (chat_id,))
+                    return None
+                return items
+
+        return await self.db.run(_claim)
+
+    async def complete(self, chat_id: int, event_ids: List[int], result: str):
+        """Записывает результат отправки сводки. При временной ошибке события войдут в следующую."""
+        if result == "sent":
+            status = "sent"
+        elif result.startswith("failed"):
+            status = "failed"
+        else:
+            return
+        await self.db.executemany(
+            "UPDATE outbox_deliveries SET status = ?, error = ? WHERE event_id = ? AND chat_id = ? AND status = 'buffered'",
+            [(status, None if status == "sent" else result, event_id, chat_id) for event_id in event_ids]
+        )
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+from aiogram import Bot
+from aiogram.utils.exceptions import (
+    BotBlocked, ChatNotFound, UserDeactivated, CantInitiateConversation, RetryAfter, TelegramAPIError
+)
+from utils.metrics import TELEGRAM_SENDS
+from config.settings import (
+    FANOUT_CONCURRENCY, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL, FANOUT_MAX_RETRIES
+)
+
+log = logging.getLogger(__name__)
+
+# Ошибки, при которых повторять отправку бессмысленно
+PERMANENT_ERRORS = (BotBlocked, ChatNotFound, UserDeactivated, CantInitiateConversation)
+
+
+class RateLimiter:
+    """Ограничивает частоту отправки: глобально и для каждого чата."""
+
+    def __init__(self, global_rate: float, chat_interval: float):
+        self.global_interval = 1 / global_rate
+        self.chat_interval = chat_interval
+        self._next_global = 0.0
+        self._next_chat: Dict[int, float] = {}
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """Останавливает все отправки (после RetryAfter от Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id: int):
+        now = time.monotonic()
+        # Резервируем слот сразу, а ждём уже после: так очередь не перемешивается
+        slot = max(now, self._paused_until, self._next_global, self._next_chat.get(chat_id, 0.0))
+        self._next_global = max(self._next_global, slot) + self.global_interval
+        self._next_chat[chat_id] = slot + self.chat_interval
+        if len(self._next_chat) > 10000:
+            self._next_chat = {cid: t for cid, t in self._next_chat.items() if t > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Notifier:
+    """Рассылка сообщений списку пользователей с ограничением параллельности и частоты."""
+
+    def __init__(self, bot: Bot, concurrency: int = FANOUT_CONCURRENCY,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE, chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+                 max_retries: int = FANOUT_MAX_RETRIES):
+        self.bot = bot
+        self.limiter = RateLimiter(global_rate, chat_interval)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+
+    async def send(self, chat_id: int, text: str, **kwargs):
+        """Отправляет одно сообщение, повторяя его после RetryAfter."""
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                log.warning("Flood control для %s, ждём %s с", chat_id, e.timeout)
+                self.limiter.pause(e.timeout)
+
+    async def deliver(self, chat_id: int, text: str, kwargs: dict) -> str:
+        """Отправляет сообщение одному получателю и возвращает статус.
+
+        "sent" — доставлено, "failed: ..." — получатель недоступен,
+        "error: ..." — временная ошибка, можно повторить.
+        """
+        async with self.semaphore:
+            try:
+                await self.send(chat_id, text, **kwargs)
+                result = "sent"
+            except PERMANENT_ERRORS as e:
+                log.info("Пользователь %s недоступен: %s", chat_id, e)
+                result = f"failed: {type(e).__name__}"
+            except TelegramAPIError as e:
+                log.warning("Не удалось отправить сообщение %s: %s", chat_id, e)
+                result = f"error: {type(e).__name__}"
+            except Exception as e:
+                log.exception("Ошибка отправки сообщения %s", chat_id)
+                result = f"error: {type(e).__name__}"
+        TELEGRAM_SENDS.inc(result=result.split(": ")[-1])
+        return result
@@ -0,0 +1,215 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+import typing
+from aiogram.dispatcher.storage import BaseStorage
+from config.settings import FSM_STATE_TTL, FSM_FLUSH_INTERVAL, FSM_CACHE_IDLE
+from utils.database import Database
+
+log = logging.getLogger(__name__)
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище состояний FSM в SQLite с кэшем в памяти.
+
+    Изменения пишутся в базу пачками раз в FSM_FLUSH_INTERVAL секунд
+    (write-behind), поэтому незаконченные диалоги переживают перезапуск.
+    Состояния, не менявшиеся дольше FSM_STATE_TTL, удаляются, а давно не
+    использовавшиеся записи вытесняются из памяти.
+
+    С shared=True (несколько процессов бота) кэш не используется: состояние
+    читается из базы на каждом обращении и записывается сразу, поэтому
+    следующий апдейт пользователя может обработать любой процесс.
+    """
+
+    def __init__(self, db: Database, ttl: float = FSM_STATE_TTL, flush_interval: float = FSM_FLUSH_INTERVAL,
+                 cache_idle: float = FSM_CACHE_IDLE, shared: bool = False):
+        self.db = db
+        self.shared = shared
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cache_idle = cache_idle
+        # (chat, user) -> {'state', 'data', 'bucket', 'updated_at', 'used_at'}
+        self._records: typing.Dict[typing.Tuple[str, str], dict] = {}
+        self._dirty: typing.Set[typing.Tuple[str, str]] = set()
+        self._flusher: typing.Optional[asyncio.Task] = None
+
+    def init(self):
+        """Создаёт таблицу состояний и удаляет истёкшие."""
+        def _init(conn):
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS fsm_states (
+                        chat TEXT NOT NULL,
+                        user TEXT NOT NULL,
+                        state TEXT,
+                        data TEXT NOT NULL DEFAULT '{}',
+                        bucket TEXT NOT NULL DEFAULT '{}',
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (chat, user)
+                    )
+                """)
+                conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (time.time() - self.ttl,))
+
+        self.db.run_sync(_init)
+
+    async def _record(self, chat, user) -> dict:
+        key = tuple(map(str, self.check_address(chat=chat, user=user)))
+        now = time.time()
+        record = None if self.shared else self._records.get(key)
+        if record is not None and record['updated_at'] < now - self.ttl:
+            # Истёкшая запись удаляется из памяти, а при записи на диск — из базы
+            record = None
+            self._records.pop(key, None)
+            self._dirty.add(key)
+        if record is None:
+            row = await self.db.fetchone(
+                "SELECT state, data, bucket, updated_at FROM fsm_states WHERE chat = ? AND user = ?", key
+            )
+            if not self.shared and key in self._records:
+                # Запись могла появиться, пока шёл запрос к базе
+                record = self._records[key]
+            elif row is not None and row[3] >= now - self.ttl:
+                record = {'state': row[0], 'data': json.loads(row[1]), 'bucket': json.loads(row[2]),
+                          'updated_at': row[3]}
+            else:
+                record = {'state': None, 'data': {}, 'bucket': {}, 'updated_at': now}
+            if not self.shared:
+                self._records[key] = record
+        record['used_at'] = now
+        record['key'] = key
+        return record
+
+    async def _touch(self, record: dict):
+        record['updated_at'] = time.time()
+        if self.shared:
+            # Состояние сразу нужно другим процессам
+            self._records[record['key']] = record
+            self._dirty.add(record['key'])
+            try:
+                await self.flush()
+            finally:
+                # Неудачная запись не повторяется в фоне: ошибку получит обработчик
+                self._records.pop(record['key'], None)
+                self._dirty.discard(record['key'])
+            return
+        self._dirty.add(record['key'])
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                # Несохранённые записи остались в _dirty: повторим в следующий раз
+                log.exception("Не удалось записать состояния FSM")
+            try:
+                self._evict()
+            except Exception:
+                log.exception("Ошибка очистки кэша состояний FSM")
+
+    async def flush(self):
+        """Записывает изменённые состояния в базу."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for key in dirty:
+            record = self._records.get(key)
+            if record is None or (record['state'] is None and not record['data'] and not record['bucket']):
+                deletes.append(key)
+            else:
+                upserts.append((*key, record['state'], json.dumps(record['data'], ensure_ascii=False),
+                                json.dumps(record['bucket'], ensure_ascii=False), record['updated_at']))
+
+        def _write(conn):
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO fsm_states (chat, user, state, data, bucket, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, upserts)
+                conn.executemany("DELETE FROM fsm_states WHERE chat = ? AND user = ?", deletes)
+                conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (time.time() - self.ttl,))
+
+        try:
+            await self.db.run(_write)
+        except Exception:
+            # Не удалось записать — попробуем в следующий раз
+            self._dirty |= dirty
+            raise
+
+    def _evict(self):
+        """Убирает из памяти записанные на диск записи, к которым давно не обращались."""
+        threshold = time.time() - self.cache_idle
+        for key in [key for key, record in self._records.items()
+                    if record['used_at'] < threshold and key not in self._dirty]:
+            del self._records[key]
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        record = await self._record(chat, user)
+        return record['state'] if record['state'] is not None else self.resolve_state(default)
+
+    async def get_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        record = await self._record(chat, user)
+        return copy.deepcopy(record['data'])
+
+    async def set_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        record = await self._record(chat, user)
+        record['state'] = self.resolve_state(state)
+        await self._touch(record)
+
+    async def set_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        record = await self._record(chat, user)
+        record['data'] = copy.deepcopy(data) if data else {}
+        await self._touch(record)
+
+    async def update_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        record = await self._record(chat, user)
+        record['data'].update(data or {}, **kwargs)
+        await self._touch(record)
+
+    async def reset_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        record = await self._record(chat, user)
+        record['state'] = None
+        if with_data:
+            record['data'] = {}
+        await self._touch(record)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        record = await self._record(chat, user)
+        return copy.deepcopy(record['bucket'])
+
+    async def set_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        record = await self._record(chat, user)
+        record['bucket'] = copy.deepcopy(bucket) if bucket else {}
+        await self._touch(record)
+
+    async def update_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None, bucket: typing.Dict = None, **kwargs):
+        record = await self._record(chat, user)
+        record['bucket'].update(bucket or {}, **kwargs)
+        await self._touch(record)
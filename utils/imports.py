@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from api.client import APIClient, api_client
+from config.settings import IMPORT_WATCH_INTERVAL, IMPORT_WATCH_MAX_INTERVAL
+from utils.database import Database, database
+from utils.db import get_authorized_users
+from utils.outbox import outbox
+
+log = logging.getLogger(__name__)
+
+# Задачи импорта в ответе supplier_import
+IMPORT_TASKS = ("tire", "disk")
+# Импорт ещё идёт: итог появится скоро, проверяем чаще и не оповещаем
+RUNNING_STATUSES = {"PENDING", "STARTED", "RETRY", "PROGRESS"}
+FAILED_STATUSES = {"FAILURE", "REVOKED", "ERROR"}
+
+# catalog(telegram_id) -> {slug: название}
+CatalogLoader = Callable[[int], Awaitable[Dict[str, str]]]
+
+
+class ImportWatcher:
+    """Фоновая проверка импорта поставщиков с оповещением только об изменениях.
+
+    Последние итоговые статусы (last_status, last_run_time) хранятся в таблице
+    import_status, поэтому после перезапуска или смены лидера старые
+    результаты не рассылаются повторно. Первый увиденный статус только
+    запоминается. Оповещение уходит, когда итоговый статус сменился или
+    импорт снова завершился ошибкой.
+
+    Пока ничего не меняется, интервал удваивается до max_interval; при
+    изменении или идущем импорте возвращается к interval. Запросы условные
+    (If-None-Match): если сайт отдаёт ETag, неизменившийся ответ приходит
+    пустым 304.
+
+    Итоговый статус запоминается только после того, как оповещение
+    поставлено в очередь: иначе при сбое очереди изменение было бы потеряно.
+    Проверка идёт от имени первого авторизованного пользователя, у которого
+    она получилась (токен другого мог быть отозван).
+    """
+
+    def __init__(self, client: APIClient, db: Database, interval: float = IMPORT_WATCH_INTERVAL,
+                 max_interval: float = IMPORT_WATCH_MAX_INTERVAL):
+        self.client = client
+        self.db = db
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        # (slug, задача) -> (last_status, last_run_time)
+        self._known: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._etags: Dict[str, str] = {}
+        self._user: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def init(self):
+        """Создаёт таблицу статусов."""
+        def _init(conn):
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS import_status (
+                        slug TEXT NOT NULL,
+                        task TEXT NOT NULL,
+                        last_status TEXT,
+                        last_run_time TEXT,
+                        PRIMARY KEY (slug, task)
+                    )
+                """)
+
+        self.db.run_sync(_init)
+
+    async def _load(self):
+        rows = await self.db.fetchall("SELECT slug, task, last_status, last_run_time FROM import_status")
+        self._known = {(slug, task): (status, run_time) for slug, task, status, run_time in rows}
+
+    async def check(self, catalog: Dict[str, str], telegram_id: int) -> Tuple[List[dict], bool]:
+        """Опрашивает всех поставщиков одновременно и ставит оповещения в очередь.
+
+        Возвращает (изменения, идёт ли сейчас какой-нибудь импорт). Если не
+        удался ни один запрос, бросает первую ошибку.
+        """
+        slugs = list(catalog)
+        results = await asyncio.gather(
+            *(self.client.poll_supplier_import(telegram_id, slug, self._etags.get(slug)) for slug in slugs),
+            return_exceptions=True
+        )
+        if results and all(isinstance(result, Exception) for result in results):
+            raise results[0]
+        changes, running, updates, etags = [], False, [], {}
+        for slug, result in zip(slugs, results):
+            if isinstance(result, Exception):
+                log.warning("Не удалось проверить импорт %s: %s", slug, result)
+                continue
+            data, etag = result
+            if etag:
+                etags[slug] = etag
+            if data is None:
+                continue
+            tasks = data.get("task_results", {})
+            for task in IMPORT_TASKS:
+                status = tasks.get(task, {}).get("last_status")
+                run_time = tasks.get(task, {}).get("last_run_time")
+                if status is None:
+                    continue
+                if status in RUNNING_STATUSES:
+                    running = True
+                    continue
+                previous = self._known.get((slug, task))
+                if previous == (status, run_time):
+                    continue
+                if previous is not None and (status != previous[0] or status in FAILED_STATUSES):
+                    change = {
+                        "slug": slug, "supplier": catalog[slug], "task": task,
+                        "status": status, "previous_status": previous[0], "last_run_time": run_time,
+                        "failed": status in FAILED_STATUSES,
+                    }
+                    try:
+                        await self._notify(change)
+                    except Exception:
+                        # Статус не запоминаем: оповещение повторится при следующей проверке
+                        log.exception("Не удалось поставить в очередь оповещение об импорте %s", slug)
+                        # С прежним ETag сайт снова отдаст этот ответ, а не пустой 304
+                        etags.pop(slug, None)
+                        continue
+                    changes.append(change)
+                updates.append((slug, task, status, run_time))
+        if updates:
+            await self.db.executemany(
+                "INSERT OR REPLACE INTO import_status (slug, task, last_status, last_run_time) VALUES (?, ?, ?, ?)",
+                updates
+            )
+            for slug, task, status, run_time in updates:
+                self._known[(slug, task)] = (status, run_time)
+        self._etags.update(etags)
+        return changes, running
+
+    async def check_any(self, catalog: CatalogLoader) -> Tuple[List[dict], bool]:
+        """Проверяет импорт от имени первого авторизованного пользователя, у которого это получится."""
+        users = list(get_authorized_users())
+        # Сначала тот, от имени которого получилось в прошлый раз
+        if self._user in users:
+            users.remove(self._user)
+            users.insert(0, self._user)
+        for telegram_id in users:
+            try:
+                result = await self.check(await catalog(telegram_id), telegram_id)
+            except Exception:
+                log.exception("Не удалось проверить импорт поставщиков от имени %s", telegram_id)
+                continue
+            self._user = telegram_id
+            return result
+        return [], False
+
+    async def _notify(self, change: dict):
+        key = f"import:{change['slug']}:{change['task']}:{change['last_run_time']}:{change['status']}"
+        await outbox.enqueue("import", change, dedup_key=key)
+
+    def start(self, catalog: CatalogLoader):
+        """Запускает проверку; catalog(telegram_id) возвращает поставщиков для опроса."""
+        if self.interval <= 0:
+            return
+
+        async def _loop():
+            await self._load()
+            delay = self.interval
+            while True:
+                try:
+                    changes, running = await self.check_any(catalog)
+                    delay = self.interval if changes or running else min(delay * 2, self.max_interval)
+                except Exception:
+                    log.exception("Ошибка проверки импорта поставщиков")
+                await asyncio.sleep(delay)
+
+        self._task = asyncio.create_task(_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Фоновая проверка импорта поставщиков
+import_watcher = ImportWatcher(api_client, database)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+from config.settings import LEADER_LEASE_TTL
+from utils.database import Database, database
+
+log = logging.getLogger(__name__)
+
+# Идентификатор процесса в арендах и захватах событий
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    """Именованная аренда в SQLite: в каждый момент ею владеет не больше одного процесса.
+
+    Владелец продлевает аренду раньше, чем истечёт ttl; аренду остановившегося
+    процесса забирает другой после истечения.
+    """
+
+    def __init__(self, db: Database, name: str, ttl: float, owner: str = INSTANCE_ID):
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner
+
+    def init(self):
+        """Создаёт таблицу аренд."""
+        def _init(conn):
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS leases (
+                        name TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+
+        self.db.run_sync(_init)
+
+    async def acquire(self) -> bool:
+        """Захватывает или продлевает аренду. True — аренда наша."""
+        def _acquire(conn):
+            now = time.time()
+            with conn:
+                cursor = conn.execute("""
+                    INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                    WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+                """, (self.name, self.owner, now + self.ttl, now))
+            return cursor.rowcount == 1
+
+        return await self.db.run(_acquire)
+
+    async def release(self):
+        """Отдаёт аренду, чтобы другой процесс мог взять её сразу."""
+        def _release(conn):
+            with conn:
+                conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, self.owner))
+
+        await self.db.run(_release)
+
+
+class Leader:
+    """Выбор лидера среди процессов бота через аренду.
+
+    Задачи, которые должны выполняться в одном экземпляре (long polling,
+    обновление токенов, регистрация вебхука), запускаются в on_elected и
+    останавливаются в on_demoted.
+    """
+
+    def __init__(self, db: Database, name: str = "leader", ttl: float = LEADER_LEASE_TTL):
+        self.lease = Lease(db, name, ttl)
+        self.is_leader = False
+        self._elected: List[Callable[[], Awaitable]] = []
+        self._demoted: List[Callable[[], Awaitable]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def init(self):
+        self.lease.init()
+
+    def on_elected(self, callback: Callable[[], Awaitable]):
+        self._elected.append(callback)
+
+    def on_demoted(self, callback: Callable[[], Awaitable]):
+        self._demoted.append(callback)
+
+    async def _run(self, callbacks):
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception:
+                log.exception("Ошибка при смене роли лидера")
+
+    async def check(self):
+        """Продлевает аренду и переключает роль, если она изменилась."""
+        try:
+            acquired = await self.lease.acquire()
+        except Exception:
+            log.exception("Не удалось продлить аренду лидера")
+            acquired = False
+        if acquired and not self.is_leader:
+            log.info("Процесс %s стал лидером", self.lease.owner)
+            self.is_leader = True
+            await self._run(self._elected)
+        elif not acquired and self.is_leader:
+            log.warning("Процесс %s потерял роль лидера", self.lease.owner)
+            self.is_leader = False
+            await self._run(self._demoted)
+
+    def start(self):
+        async def _loop():
+            while True:
+                await self.check()
+                # Продлеваем с запасом, чтобы аренда не истекла между проверками
+                await asyncio.sleep(self.lease.ttl / 3)
+
+        self._task = asyncio.create_task(_loop())
+
+    async def stop(self):
+        """Останавливает задачи лидера и отдаёт аренду."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self._run(self._demoted)
+            await self.lease.release()
+
+
+# Лидер среди процессов бота
+leader = Leader(database)
@@ -0,0 +1,206 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Метки, добавляемые ко всем значениям (например, номер процесса)
+CONST_LABELS: Dict[str, str] = {}
+
+
+def set_const_labels(**labels):
+    """Задаёт метки, которые получат все метрики процесса.
+
+    Когда процессов несколько, /metrics отвечает тот, кого выбрало ядро:
+    без метки процесса счётчики разных процессов смешивались бы между опросами.
+    """
+    CONST_LABELS.update({name: str(value) for name, value in labels.items()})
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in CONST_LABELS.items()]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """Метрика в текстовом формате Prometheus."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Значение вычисляется при каждом запросе /metrics функцией collect().
+
+    collect() возвращает словарь {значения меток: число}.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, collect: Callable[[], Dict[Tuple[str, ...], float]], labels=()):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in self.collect().items()]
+
+
+class CollectedCounter(Gauge):
+    """Счётчик, значение которого берётся при запросе /metrics (например, hits кэша)."""
+
+    type = "counter"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики корзин..., сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Измеряет длительность блока with."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        for key, state in self._values.items():
+            for bound, count in zip(self.buckets, state):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {count}")
+            le = 'le="+Inf"'
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {state[-1]}")
+            lines.append(f"{self.name}_sum{labels} {state[-2]}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+# Метрики бота
+HANDLER_DURATION = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Время обработки апдейта по обработчикам", ("update_type", "handler")
+))
+API_REQUEST_DURATION = registry.register(Histogram(
+    "api_request_duration_seconds", "Время запросов к API сайта", ("method", "endpoint", "status")
+))
+TELEGRAM_SENDS = registry.register(Counter(
+    "telegram_sends_total", "Отправки уведомлений в Telegram по результату", ("result",)
+))
+TELEGRAM_REQUESTS = registry.register(Counter(
+    "telegram_requests_total", "Все запросы к Bot API (уведомления и ответы обработчиков) по методу и результату",
+    ("method", "result")
+))
+WEBHOOK_EVENTS = registry.register(Counter(
+    "webhook_events_total", "Входящие вебхуки сайта", ("kind", "result")
+))
+FANOUT_DURATION = registry.register(Histogram(
+    "fanout_duration_seconds", "Время рассылки одного события всем получателям", ("kind",),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+))
+
+
+# Кэши (объекты с атрибутами hits и misses) и счётчики фоновых задач по именам
+CACHES: Dict[str, object] = {}
+BACKGROUND: Dict[str, Callable[[], int]] = {}
+
+
+def register_cache(name: str, cache):
+    """Добавляет кэш в метрики попаданий."""
+    CACHES[name] = cache
+
+
+def register_background(kind: str, count: Callable[[], int]):
+    """Добавляет в метрики число незавершённых фоновых задач вида kind."""
+    BACKGROUND[kind] = count
+
+
+def _hit_ratio(cache) -> float:
+    total = cache.hits + cache.misses
+    return cache.hits / total if total else 0
+
+
+registry.register(CollectedCounter(
+    "cache_hits_total", "Попадания в кэш", lambda: {(name,): cache.hits for name, cache in CACHES.items()}, ("cache",)
+))
+registry.register(CollectedCounter(
+    "cache_misses_total", "Промахи кэша", lambda: {(name,): cache.misses for name, cache in CACHES.items()},
+    ("cache",)
+))
+registry.register(Gauge(
+    "cache_hit_ratio", "Доля попаданий в кэш",
+    lambda: {(name,): _hit_ratio(cache) for name, cache in CACHES.items()}, ("cache",)
+))
+registry.register(Gauge(
+    "background_tasks", "Незавершённые фоновые задачи", lambda: {(kind,): count() for kind, count in BACKGROUND.items()},
+    ("kind",)
+))
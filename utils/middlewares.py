@@ -0,0 +1,34 @@
+import time
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+from utils.callbacks import handler_name
+from utils.metrics import HANDLER_DURATION
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Записывает время обработки сообщений и нажатий кнопок по обработчикам."""
+
+    async def on_pre_process_message(self, message: Message, data: dict):
+        data["_started_at"] = time.perf_counter()
+
+    async def on_pre_process_callback_query(self, call: CallbackQuery, data: dict):
+        data["_started_at"] = time.perf_counter()
+
+    async def on_process_message(self, message: Message, data: dict):
+        data["_handler"] = handler_name(data)
+
+    async def on_process_callback_query(self, call: CallbackQuery, data: dict):
+        data["_handler"] = handler_name(data)
+
+    async def on_post_process_message(self, message: Message, results, data: dict):
+        self._observe("message", data)
+
+    async def on_post_process_callback_query(self, call: CallbackQuery, results, data: dict):
+        self._observe("callback_query", data)
+
+    @staticmethod
+    def _observe(update_type: str, data: dict):
+        started_at = data.pop("_started_at", None)
+        if started_at is not None:
+            handler = data.pop("_handler", "unhandled")
+            HANDLER_DURATION.observe(time.perf_counter() - started_at, update_type=update_type, handler=handler)
@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from config.settings import (
+    OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, OUTBOX_CLAIM_TTL, OUTBOX_SWEEP_INTERVAL,
+    OUTBOX_RETENTION, OUTBOX_CLEANUP_INTERVAL
+)
+from utils.database import Database, database
+from utils.dedup import DedupIndex
+from utils.digest import DigestBuffer
+from utils.fanout import Notifier
+from utils.leases import INSTANCE_ID
+from utils.metrics import FANOUT_DURATION
+
+log = logging.getLogger(__name__)
+
+# render(payload) -> (текст, параметры send_message)
+Renderer = Callable[[dict], Tuple[str, dict]]
+# recipients(kind, payload) -> список chat_id
+RecipientsResolver = Callable[[str, dict], Iterable[int]]
+# render_digest([(event_id, kind, payload)]) -> (текст, параметры send_message)
+DigestRenderer = Callable[[List[Tuple[int, str, dict]]], Tuple[str, dict]]
+
+# Сколько событий удалять одной транзакцией, чтобы не держать блокировку записи
+CLEANUP_BATCH = 500
+
+
+class DuplicateEvent(Exception):
+    """Событие уже сохранил другой процесс; транзакция откатывается."""
+
+
+class Outbox:
+    """Очередь входящих событий вебхуков в SQLite.
+
+    Событие сохраняется до ответа сайту, рассылку выполняют фоновые воркеры.
+    Статус доставки хранится для каждого получателя, поэтому после перезапуска
+    досылаются только недоставленные сообщения.
+
+    Очередь может разбирать несколько процессов: событие рассылает тот, кто
+    его захватил (claimed_by). Захват продлевается во время рассылки;
+    события остановившегося процесса после истечения захвата подбирает
+    периодический обход.
+
+    Если задан DIGEST_WINDOW и зарегистрирована сводка (register_digest),
+    события, пришедшие получателю подряд, объединяются в одно сообщение.
+
+    Завершённые события старше OUTBOX_RETENTION удаляет процесс-лидер
+    (start_cleanup); события с недоставленными или отложенными в сводку
+    сообщениями не удаляются.
+    """
+
+    def __init__(self, db: Database, owner: str = INSTANCE_ID):
+        self.db = db
+        self.owner = owner
+        self.dedup = DedupIndex(db)
+        self.digest = DigestBuffer(db)
+        self.renderers: Dict[str, Renderer] = {}
+        self.render_digest: Optional[DigestRenderer] = None
+        self.queue: "asyncio.Queue[int]" = asyncio.Queue()
+        self._queued = set()
+        self.workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._digester: Optional[asyncio.Task] = None
+        self._cleaner: Optional[asyncio.Task] = None
+        self.notifier: Optional[Notifier] = None
+        self.get_recipients: Optional[RecipientsResolver] = None
+        self.is_silent: Optional[Callable[[int], bool]] = None
+
+    def init(self):
+        """Создаёт таблицы очереди."""
+        def _init(conn):
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS outbox_events (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        kind TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        created_at REAL NOT NULL,
+                        claimed_by TEXT,
+                        claim_expires REAL,
+                        errors INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                # Таблицы, созданные до появления захватов и счётчика ошибок
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox_events)")}
+                for column, kind in (("claimed_by", "TEXT"), ("claim_expires", "REAL"),
+                                     ("errors", "INTEGER NOT NULL DEFAULT 0")):
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE outbox_events ADD COLUMN {column} {kind}")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS outbox_deliveries (
+                        event_id INTEGER NOT NULL REFERENCES outbox_events(id) ON DELETE CASCADE,
+                        chat_id INTEGER NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        error TEXT,
+                        PRIMARY KEY (event_id, chat_id)
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS outbox_events_status ON outbox_events(status)")
+
+        self.db.run_sync(_init)
+        self.dedup.init()
+        self.digest.init()
+
+    def register(self, kind: str, render: Renderer):
+        """Регистрирует функцию формирования сообщения для типа события."""
+        self.renderers[kind] = render
+
+    def register_digest(self, render_digest: DigestRenderer):
+        """Регистрирует функцию формирования сводки из нескольких событий."""
+        self.render_digest = render_digest
+
+    @property
+    def digest_enabled(self) -> bool:
+        return self.digest.enabled and self.render_digest is not None
+
+    async def event_message(self, event_id: int, chat_id: int) -> Optional[Tuple[str, dict]]:
+        """Полное сообщение о событии для получателя, которому оно приходило (кнопки сводки)."""
+        event = await self.db.fetchone("""
+            SELECT e.kind, e.payload FROM outbox_events e
+            JOIN outbox_deliveries d ON d.event_id = e.id
+            WHERE e.id = ? AND d.chat_id = ?
+        """, (event_id, chat_id))
+        if event is None or event[0] not in self.renderers:
+            return None
+        return self.renderers[event[0]](json.loads(event[1]))
+
+    async def enqueue(self, kind: str, payload: dict, dedup_key: Optional[str] = None) -> Optional[int]:
+        """Сохраняет событие и ставит его в очередь на рассылку.
+
+        Если событие с таким dedup_key уже принималось в пределах окна,
+        ничего не сохраняет и возвращает None.
+        """
+        if dedup_key is not None and not self.dedup.add(dedup_key):
+            return None
+
+        def _insert(conn):
+            with conn:
+                if not self.dedup.record(conn, dedup_key):
+                    raise DuplicateEvent(dedup_key)
+                # Событие сразу закреплено за принявшим его процессом
+                cursor = conn.execute(
+                    "INSERT INTO outbox_events (kind, payload, created_at, claimed_by, claim_expires) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (kind, json.dumps(payload, ensure_ascii=False), time.time(), self.owner,
+                     time.time() + OUTBOX_CLAIM_TTL)
+                )
+            return cursor.lastrowid
+
+        try:
+            event_id = await self.db.run(_insert)
+        except DuplicateEvent:
+            return None
+        except Exception:
+            if dedup_key is not None:
+                self.dedup.discard(dedup_key)
+            raise
+        self._put(event_id)
+        return event_id
+
+    def _put(self, event_id: int):
+        # Событие не должно попасть в очередь дважды (например, при запуске)
+        if event_id not in self._queued:
+            self._queued.add(event_id)
+            self.queue.put_nowait(event_id)
+
+    async def start(self, notifier: Notifier, get_recipients: RecipientsResolver, workers: int = OUTBOX_WORKERS,
+                    is_silent: Optional[Callable[[int], bool]] = None):
+        """Запускает воркеры и возвращает в очередь незавершённые события.
+
+        is_silent(chat_id) — отправлять ли получателю сообщение без звука.
+        """
+        self.notifier = notifier
+        self.get_recipients = get_recipients
+        self.is_silent = is_silent
+        await self.sweep()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        if self.digest_enabled:
+            self._digester = asyncio.create_task(self._digest_loop())
+
+    async def stop(self):
+        """Останавливает воркеры и отпускает захваченные события; незавершённые останутся в базе."""
+        tasks = self.workers + [task for task in (self._sweeper, self._digester) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers, self._sweeper, self._digester = [], None, None
+        # Другие процессы смогут разослать их, не дожидаясь истечения захвата
+        await self.db.execute(
+            "UPDATE outbox_events SET claimed_by = NULL, claim_expires = NULL WHERE status = 'pending' AND claimed_by = ?",
+            (self.owner,)
+        )
+
+    async def sweep(self):
+        """Ставит в очередь свои и никем не захваченные незавершённые события."""
+        rows = await self.db.fetchall(
+            "SELECT id FROM outbox_events WHERE status = 'pending' "
+            "AND (claimed_by IS NULL OR claimed_by = ? OR claim_expires < ?) ORDER BY id",
+            (self.owner, time.time())
+        )
+        for (event_id,) in rows:
+            self._put(event_id)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(OUTBOX_SWEEP_INTERVAL)
+            try:
+                await self.sweep()
+            except Exception:
+                log.exception("Ошибка обхода очереди событий")
+
+    async def cleanup(self, retention: float = OUTBOX_RETENTION) -> int:
+        """Удаляет завершённые события старше retention вместе с доставками; возвращает их число."""
+        def _delete(conn):
+            with conn:
+                ids = [row[0] for row in conn.execute("""
+                    SELECT id FROM outbox_events e
+                    WHERE status IN ('done', 'failed') AND created_at < ?
+                    AND NOT EXISTS (
+                        SELECT 1 FROM outbox_deliveries d
+                        WHERE d.event_id = e.id AND d.status IN ('pending', 'buffered')
+                    )
+                    LIMIT ?
+                """, (time.time() - retention, CLEANUP_BATCH))]
+                conn.executemany("DELETE FROM outbox_deliveries WHERE event_id = ?", [(i,) for i in ids])
+                conn.executemany("DELETE FROM outbox_events WHERE id = ?", [(i,) for i in ids])
+            return len(ids)
+
+        total = 0
+        while True:
+            deleted = await self.db.run(_delete)
+            total += deleted
+            if deleted < CLEANUP_BATCH:
+                return total
+
+    def start_cleanup(self, interval: float = OUTBOX_CLEANUP_INTERVAL):
+        """Запускает периодическое удаление устаревших событий (в одном процессе — лидере)."""
+        if interval <= 0 or self._cleaner is not None:
+            return
+
+        async def _loop():
+            while True:
+                try:
+                    deleted = await self.cleanup()
+                    if deleted:
+                        log.info("Удалено устаревших событий: %s", deleted)
+                except Exception:
+                    log.exception("Ошибка удаления устаревших событий")
+                await asyncio.sleep(interval)
+
+        self._cleaner = asyncio.create_task(_loop())
+
+    async def stop_cleanup(self):
+        if self._cleaner is not None:
+            self._cleaner.cancel()
+            await asyncio.gather(self._cleaner, return_exceptions=True)
+            self._cleaner = None
+
+    async def _claim(self, event_id: int) -> bool:
+        """Захватывает или продлевает захват события. False — его рассылает другой процесс."""
+        def _update(conn):
+            now = time.time()
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE outbox_events SET claimed_by = ?, claim_expires = ? WHERE id = ? AND status = 'pending' "
+                    "AND (claimed_by IS NULL OR claimed_by = ? OR claim_expires < ?)",
+                    (self.owner, now + OUTBOX_CLAIM_TTL, event_id, self.owner, now)
+                )
+            return cursor.rowcount == 1
+
+        return await self.db.run(_update)
+
+    async def _keep_claim(self, event_id: int):
+        while True:
+            await asyncio.sleep(OUTBOX_CLAIM_TTL / 3)
+            await self._claim(event_id)
+
+    async def _worker(self):
+        while True:
+            event_id = await self.queue.get()
+            self._queued.discard(event_id)
+            try:
+                await self._process(event_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Ошибка обработки события %s", event_id)
+                await self._record_error(event_id)
+            finally:
+                self.queue.task_done()
+
+    async def _record_error(self, event_id: int):
+        """Считает сбои обработки события; после OUTBOX_MAX_ATTEMPTS событие помечается failed."""
+        def _increment(conn):
+            with conn:
+                conn.execute("UPDATE outbox_events SET errors = errors + 1 WHERE id = ?", (event_id,))
+                return conn.execute("SELECT errors FROM outbox_events WHERE id = ?", (event_id,)).fetchone()
+
+        try:
+            row = await self.db.run(_increment)
+        except Exception:
+            log.exception("Не удалось записать ошибку события %s", event_id)
+            self._retry_later(event_id)
+            return
+        if row is not None and row[0] >= OUTBOX_MAX_ATTEMPTS:
+            log.error("Событие %s не обработано после %s попыток, помечено как failed", event_id, row[0])
+            await self.db.execute("UPDATE outbox_events SET status = 'failed' WHERE id = ?", (event_id,))
+        else:
+            self._retry_later(event_id)
+
+    def _retry_later(self, event_id: int):
+        asyncio.get_running_loop().call_later(OUTBOX_RETRY_DELAY, self._put, event_id)
+
+    async def _process(self, event_id: int):
+        if not await self._claim(event_id):
+            return
+        keeper = asyncio.create_task(self._keep_claim(event_id))
+        try:
+            await self._process_claimed(event_id)
+        finally:
+            keeper.cancel()
+
+    async def _process_claimed(self, event_id: int):
+        event = await self.db.fetchone("SELECT kind, payload, status FROM outbox_events WHERE id = ?", (event_id,))
+        if event is None or event[2] != "pending":
+            return
+        kind, payload = event[0], json.loads(event[1])
+
+        try:
+            text, kwargs = self.renderers[kind](payload)
+        except Exception:
+            log.exception("Не удалось сформировать сообщение для события %s", event_id)
+            await self.db.execute("UPDATE outbox_events SET status = 'failed' WHERE id = ?", (event_id,))
+            return
+
+        # Список получателей фиксируется при первой обработке события
+        if await self.db.fetchone("SELECT 1 FROM outbox_deliveries WHERE event_id = ? LIMIT 1", (event_id,)) is None:
+            await self.db.executemany(
+                "INSERT OR IGNORE INTO outbox_deliveries (event_id, chat_id) VALUES (?, ?)",
+                [(event_id, chat_id) for chat_id in self.get_recipients(kind, payload)]
+            )
+        pending = await self.db.fetchall(
+            "SELECT chat_id, attempts FROM outbox_deliveries WHERE event_id = ? AND status = 'pending'", (event_id,)
+        )
+
+        with FANOUT_DURATION.time(kind=kind):
+            results = await asyncio.gather(*(
+                self._deliver(event_id, chat_id, attempts, text, kwargs) for chat_id, attempts in pending
+            ))
+        if all(results):
+            await self.db.execute("UPDATE outbox_events SET status = 'done' WHERE id = ?", (event_id,))
+        else:
+            self._retry_later(event_id)
+
+    async def _deliver(self, event_id: int, chat_id: int, attempts: int, text: str, kwargs: dict) -> bool:
+        """Отправляет сообщение одному получателю. False — нужна повторная попытка."""
+        if self.digest_enabled and await self.digest.buffer(event_id, chat_id):
+            # Уйдёт в сводке, когда закроется окно получателя
+            return True
+        result = await self.notifier.deliver(chat_id, text, self._options(chat_id, kwargs))
+        attempts += 1
+        if result == "sent":
+            status = "sent"
+        elif result.startswith("failed") or attempts >= OUTBOX_MAX_ATTEMPTS:
+            status = "failed"
+        else:
+            status = "pending"
+        await self.db.execute(
+            "UPDATE outbox_deliveries SET status = ?, attempts = ?, error = ? WHERE event_id = ? AND chat_id = ?",
+            (status, attempts, None if status == "sent" else result, event_id, chat_id)
+        )
+        return status != "pending"
+
+
+    def _options(self, chat_id: int, kwargs: dict) -> dict:
+        if self.is_silent is not None and self.is_silent(chat_id):
+            return {**kwargs, "disable_notification": True}
+        return kwargs
+
+    async def _digest_loop(self):
+        # Окна проверяются несколько раз за период, чтобы сводка не запаздывала
+        interval = min(1.0, self.digest.window / 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                due = await self.digest.due()
+                await asyncio.gather(*(self._send_digest(chat_id, flush_at) for chat_id, flush_at in due))
+            except Exception:
+                log.exception("Ошибка отправки сводок")
+
+    async def _send_digest(self, chat_id: int, flush_at: float):
+        items = await self.digest.claim(chat_id, flush_at)
+        if not items:
+            return
+        events = [(event_id, kind, json.loads(payload)) for event_id, kind, payload in items]
+        if len(events) == 1:
+            # Одно событие за окно отправляем обычным сообщением
+            event_id, kind, payload = events[0]
+            text, kwargs = self.renderers[kind](payload)
+        else:
+            text, kwargs = self.render_digest(events)
+        result = await self.notifier.deliver(chat_id, text, self._options(chat_id, kwargs))
+        await self.digest.complete(chat_id, [event_id for event_id, _, _ in events], result)
+
+
+# Общая очередь событий вебхуков
+outbox = Outbox(database)
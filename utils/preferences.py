@@ -0,0 +1,129 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+from zoneinfo import ZoneInfo
+from config.settings import NOTIFY_TIMEZONE
+
+
+class Preferences(NamedTuple):
+    """Настройки уведомлений пользователя."""
+    orders: bool = True
+    feedback: bool = True
+    # Оповещения о смене статуса импорта поставщиков — только по подписке
+    imports: bool = False
+    # Имена поставщиков (supplier_info.name); None — все поставщики
+    suppliers: Optional[FrozenSet[str]] = None
+    # Минимальная сумма заказа, ₽
+    min_total: float = 0
+    # Тихие часы [quiet_start, quiet_end) по местному времени; сообщения приходят без звука
+    quiet_start: Optional[int] = None
+    quiet_end: Optional[int] = None
+
+    def is_quiet(self, hour: int) -> bool:
+        if self.quiet_start is None or self.quiet_end is None or self.quiet_start == self.quiet_end:
+            return False
+        if self.quiet_start < self.quiet_end:
+            return self.quiet_start <= hour < self.quiet_end
+        # Интервал через полночь, например 23–8
+        return hour >= self.quiet_start or hour < self.quiet_end
+
+
+DEFAULT_PREFERENCES = Preferences()
+
+
+def order_suppliers(detail: dict) -> Set[str]:
+    """Поставщики, у которых есть товары заказа."""
+    names = (
+        (info.get('supplier_info') or {}).get('name')
+        for item in detail.get('items') or []
+        for info in (item.get('product') or {}).get('product_supplier_info') or []
+    )
+    return {name for name in names if name}
+
+
+class PreferenceIndex:
+    """Индекс настроек уведомлений в памяти процесса.
+
+    Хранит только отличия от настроек по умолчанию и раскладывает их так,
+    чтобы получатели события находились без перебора всех пользователей:
+    отписавшиеся по типу события, пороги суммы в отсортированном списке,
+    подписчики по поставщикам. Изменения сначала пишутся в базу
+    (utils/db.py), затем сюда.
+    """
+
+    def __init__(self, timezone: str = NOTIFY_TIMEZONE):
+        self.timezone = ZoneInfo(timezone)
+        self._prefs: Dict[int, Preferences] = {}
+        self._rebuild()
+
+    def load(self, rows):
+        """Заполняет индекс строками таблицы notification_prefs."""
+        self._prefs = {}
+        for telegram_id, orders, feedback, imports, suppliers, min_total, quiet_start, quiet_end in rows:
+            self._prefs[telegram_id] = Preferences(
+                orders=bool(orders), feedback=bool(feedback), imports=bool(imports),
+                suppliers=frozenset(filter(None, suppliers.split("\n"))) if suppliers is not None else None,
+                min_total=min_total or 0, quiet_start=quiet_start, quiet_end=quiet_end,
+            )
+        self._rebuild()
+
+    def _rebuild(self):
+        self._muted = {
+            "order": {tid for tid, prefs in self._prefs.items() if not prefs.orders},
+            "feedback": {tid for tid, prefs in self._prefs.items() if not prefs.feedback},
+        }
+        self._import_subscribers = {tid for tid, prefs in self._prefs.items() if prefs.imports}
+        thresholds = sorted((prefs.min_total, tid) for tid, prefs in self._prefs.items() if prefs.min_total > 0)
+        self._threshold_values = [value for value, _ in thresholds]
+        self._threshold_ids = [tid for _, tid in thresholds]
+        self._supplier_filtered = {tid for tid, prefs in self._prefs.items() if prefs.suppliers is not None}
+        self._by_supplier: Dict[str, Set[int]] = {}
+        for tid in self._supplier_filtered:
+            for supplier in self._prefs[tid].suppliers:
+                self._by_supplier.setdefault(supplier, set()).add(tid)
+        self._quiet = {tid for tid, prefs in self._prefs.items() if prefs.quiet_start is not None}
+
+    def get(self, telegram_id: int) -> Preferences:
+        return self._prefs.get(telegram_id, DEFAULT_PREFERENCES)
+
+    def set(self, telegram_id: int, prefs: Preferences):
+        if prefs == DEFAULT_PREFERENCES:
+            self._prefs.pop(telegram_id, None)
+        else:
+            self._prefs[telegram_id] = prefs
+        self._rebuild()
+
+    def recipients(self, kind: str, payload: dict, candidates: Iterable[int]) -> List[int]:
+        """Получатели события из candidates (авторизованных пользователей)."""
+        excluded = set(self._muted.get(kind, ()))
+        if kind == "import":
+            supplier = payload.get('supplier')
+            return [
+                tid for tid in candidates
+                if tid in self._import_subscribers
+                and (tid not in self._supplier_filtered or supplier in self._prefs[tid].suppliers)
+            ]
+        if kind == "order":
+            detail = payload.get('detail', {})
+            try:
+                total = float(detail.get('total_price_with_discount') or 0)
+            except (TypeError, ValueError):
+                total = 0
+            # Пороги выше суммы заказа — в хвосте отсортированного списка
+            excluded.update(self._threshold_ids[bisect_right(self._threshold_values, total):])
+            if self._supplier_filtered:
+                matching = set()
+                for supplier in order_suppliers(detail):
+                    matching |= self._by_supplier.get(supplier, set())
+                excluded |= self._supplier_filtered - matching
+        return [tid for tid in candidates if tid not in excluded]
+
+    def is_silent(self, telegram_id: int) -> bool:
+        """Приходится ли сейчас на тихие часы пользователя."""
+        if telegram_id not in self._quiet:
+            return False
+        return self._prefs[telegram_id].is_quiet(datetime.now(self.timezone).hour)
+
+
+# Общий индекс настроек уведомлений процесса
+preference_index = PreferenceIndex()
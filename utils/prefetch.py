@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Set
+from config.settings import PREFETCH_CONCURRENCY
+from utils.profiling import untracked
+
+log = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Фоновая предзагрузка данных, которые пользователь, скорее всего, откроет следующими.
+
+    Общий лимит параллельных запросов защищает API сайта. Новая предзагрузка
+    для пользователя отменяет его предыдущую.
+    """
+
+    def __init__(self, concurrency: int = PREFETCH_CONCURRENCY):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[int, Set[asyncio.Task]] = {}
+
+    def schedule(self, user_id: int, fetches: Iterable[Callable[[], Awaitable]]):
+        """Запускает предзагрузку для пользователя вместо предыдущей."""
+        self.cancel(user_id)
+        tasks = {asyncio.create_task(untracked(self._run(fetch))) for fetch in fetches}
+        if not tasks:
+            return
+        self._tasks[user_id] = tasks
+        for task in tasks:
+            task.add_done_callback(lambda task, user_id=user_id: self._forget(user_id, task))
+
+    def pending(self) -> int:
+        """Число незавершённых задач предзагрузки."""
+        return sum(len(tasks) for tasks in self._tasks.values())
+
+    def cancel(self, user_id: int):
+        """Отменяет незавершённую предзагрузку пользователя."""
+        for task in self._tasks.pop(user_id, ()):
+            task.cancel()
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        tasks = self._tasks.get(user_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[user_id]
+
+    async def _run(self, fetch: Callable[[], Awaitable]):
+        async with self.semaphore:
+            try:
+                await fetch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.debug("Предзагрузка не удалась: %s", e)
+
+
+# Общий планировщик предзагрузки
+prefetcher = Prefetcher()
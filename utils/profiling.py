@@ -0,0 +1,173 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+from aiogram import Bot, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from config.settings import (
+    SLOW_UPDATE_THRESHOLD, SLOW_UPDATES_LOG, SLOW_UPDATES_LOG_BYTES, SLOW_UPDATES_LOG_BACKUPS,
+    PROFILE_HANDLERS, PROFILE_SAMPLE_RATE, PROFILE_DIR
+)
+from utils.callbacks import handler_name
+from utils.metrics import TELEGRAM_REQUESTS
+
+log = logging.getLogger(__name__)
+
+# Время ожидания по категориям для обрабатываемого апдейта
+update_timings: ContextVar[Optional[dict]] = ContextVar("update_timings", default=None)
+
+TIMING_KINDS = ("api", "db", "telegram")
+# Ожидание любого вида: из него считается время вне ожиданий («other»)
+WAITING = "waiting"
+
+
+def _enter(timings: dict, kind: str, now: float):
+    depth = timings["_depth"]
+    if not depth[kind]:
+        timings["_since"][kind] = now
+    depth[kind] += 1
+
+
+def _leave(timings: dict, kind: str, now: float):
+    depth = timings["_depth"]
+    depth[kind] -= 1
+    if not depth[kind]:
+        timings[kind] += now - timings["_since"][kind]
+
+
+@contextmanager
+def track(kind: str):
+    """Добавляет длительность блока к категории kind текущего апдейта.
+
+    Одновременные ожидания (ветки gather, вложенные track) объединяются:
+    категория получает время, когда шло хотя бы одно ожидание этого вида,
+    поэтому не может превысить общее время апдейта.
+    """
+    timings = update_timings.get()
+    if timings is None:
+        yield
+        return
+    now = time.perf_counter()
+    _enter(timings, kind, now)
+    _enter(timings, WAITING, now)
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        _leave(timings, kind, now)
+        _leave(timings, WAITING, now)
+
+
+async def untracked(awaitable):
+    """Выполняет корутину вне профиля апдейта.
+
+    Фоновые задачи, запущенные из обработчика, наследуют его контекст и
+    иначе добавляли бы своё время к апдейту, который уже мог завершиться.
+    """
+    update_timings.set(None)
+    return await awaitable
+
+
+class ProfiledBot(Bot):
+    """Бот, учитывающий время запросов к Bot API в профиле апдейта, а их результаты — в метриках."""
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        result = "ok"
+        try:
+            with track("telegram"):
+                return await super().request(method, data, files, **kwargs)
+        except BaseException as e:
+            result = type(e).__name__
+            raise
+        finally:
+            TELEGRAM_REQUESTS.inc(method=method, result=result)
+
+
+def _slow_updates_logger() -> logging.Logger:
+    logger = logging.getLogger("slow_updates")
+    if not logger.handlers:
+        handler = RotatingFileHandler(SLOW_UPDATES_LOG, maxBytes=SLOW_UPDATES_LOG_BYTES,
+                                      backupCount=SLOW_UPDATES_LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Замеряет полное время обработки апдейта и раскладывает его на ожидание
+    API сайта, SQLite и Bot API.
+
+    Апдейты дольше SLOW_UPDATE_THRESHOLD секунд пишутся в SLOW_UPDATES_LOG.
+    Для обработчиков из PROFILE_HANDLERS доля PROFILE_SAMPLE_RATE апдейтов
+    профилируется cProfile, результаты сохраняются в PROFILE_DIR.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.slow_log = _slow_updates_logger()
+        self._profiling = False
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        timings = dict.fromkeys(TIMING_KINDS + (WAITING,), 0.0)
+        timings["started_at"] = time.perf_counter()
+        # Число идущих ожиданий и начало текущего интервала по категориям
+        timings["_depth"] = dict.fromkeys(TIMING_KINDS + (WAITING,), 0)
+        timings["_since"] = {}
+        data["_timings_token"] = update_timings.set(timings)
+        data["_timings"] = timings
+        log.debug("Получен апдейт [ID:%s]", update.update_id)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._enter_handler(data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._enter_handler(data)
+
+    def _enter_handler(self, data: dict):
+        timings = update_timings.get()
+        if timings is None:
+            return
+        handler = handler_name(data)
+        timings["handler"] = handler
+        if handler in PROFILE_HANDLERS and not self._profiling and random.random() < PROFILE_SAMPLE_RATE:
+            # cProfile не поддерживает несколько профилей одновременно
+            self._profiling = True
+            timings["profile"] = cProfile.Profile()
+            timings["profile"].enable()
+
+    async def on_post_process_update(self, update: types.Update, results, data: dict):
+        timings = data.pop("_timings", None)
+        token = data.pop("_timings_token", None)
+        if timings is None:
+            return
+        if token is not None:
+            update_timings.reset(token)
+        total = time.perf_counter() - timings["started_at"]
+        handler = timings.get("handler", "unhandled")
+
+        profile = timings.get("profile")
+        if profile is not None:
+            profile.disable()
+            self._profiling = False
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile.dump_stats(os.path.join(PROFILE_DIR, f"{handler}-{update.update_id}.prof"))
+
+        log.info("Апдейт [ID:%s] обработан %s за %d мс", update.update_id, handler, total * 1000)
+        if total >= SLOW_UPDATE_THRESHOLD:
+            record = {
+                "update_id": update.update_id,
+                "handler": handler,
+                "total": round(total, 4),
+                **{kind: round(timings[kind], 4) for kind in TIMING_KINDS},
+                # Категории могут пересекаться между собой, объединение — нет
+                "other": round(total - timings[WAITING], 4),
+            }
+            self.slow_log.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,52 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class UserRegistry:
+    """Копия таблицы users в памяти процесса.
+
+    Читается на каждом запросе вместо SQLite; все изменения сначала
+    записываются в базу (utils/db.py), затем сюда.
+    """
+
+    def __init__(self):
+        # telegram_id -> (is_authorized, access_token, refresh_token)
+        self._users: Dict[int, Tuple[bool, Optional[str], Optional[str]]] = {}
+
+    def load(self, rows):
+        """Заполняет реестр строками (telegram_id, is_authorized, access_token, refresh_token)."""
+        self._users = {
+            telegram_id: (bool(is_authorized), access_token, refresh_token)
+            for telegram_id, is_authorized, access_token, refresh_token in rows
+        }
+
+    def is_authorized(self, telegram_id: int) -> bool:
+        user = self._users.get(telegram_id)
+        return user is not None and user[0]
+
+    def authorized_ids(self) -> List[int]:
+        return [telegram_id for telegram_id, user in self._users.items() if user[0]]
+
+    def authorized_tokens(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        """(telegram_id, access_token, refresh_token) всех авторизованных пользователей."""
+        return [(telegram_id, user[1], user[2]) for telegram_id, user in self._users.items() if user[0]]
+
+    def get_tokens(self, telegram_id: int) -> Optional[Tuple[str, str]]:
+        user = self._users.get(telegram_id)
+        if user is None:
+            return None
+        return user[1], user[2]
+
+    def set_user(self, telegram_id: int, access_token: str, refresh_token: str, is_authorized: bool = True):
+        self._users[telegram_id] = (is_authorized, access_token, refresh_token)
+
+    def set_access_token(self, telegram_id: int, access_token: str):
+        user = self._users.get(telegram_id)
+        if user is not None:
+            self._users[telegram_id] = (user[0], access_token, user[2])
+
+    def remove(self, telegram_id: int):
+        self._users.pop(telegram_id, None)
+
+
+# Общий реестр пользователей процесса
+user_registry = UserRegistry()
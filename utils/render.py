@@ -0,0 +1,188 @@
+from typing import Callable
+from config.settings import RENDER_CACHE_SIZE
+from utils.cache import TTLCache
+
+# Шаблоны сообщений о заказе
+ORDER_HEADER = (
+    "<b>📦 {title} №{id}</b>\n\n"
+    "<b>Информация о заказе:</b>\n"
+    "📝 <b>Статус:</b> {status}\n"
+    "💰 <b>Сумма:</b> {total} ₽\n"
+    "📦 <b>Количество товаров:</b> {quantity}\n"
+    "📦 <b>Количество позиций:</b> {positions}\n"
+    "📍 <b>Адрес доставки:</b> {address}\n\n"
+    "<b>Информация о клиенте:</b>\n"
+    "👤 <b>Имя:</b> {first_name} {last_name} {patronymic}\n"
+    "📧 <b>Email:</b> {email}\n"
+    "📞 <b>Телефон:</b> {tel}\n\n"
+    "<b>🛒 Товары в заказе:</b>\n"
+)
+ORDER_ITEM = (
+    "{idx}. 🔹 <b>{name}</b>\n"
+    "    🆔 Артикул: {item_number}\n"
+    "    💰 Цена: {price} ₽\n"
+    "    📦 Количество: {quantity} шт.\n"
+)
+SUPPLIERS_HEADER = "    📊 Остатки у поставщиков:\n"
+SUPPLIER_STOCK = (
+    "        🔸 <b>{name}:</b>\n"
+    "           • Остаток: {quantity} шт.\n"
+    "           • Цена поставки: {purchase_price} ₽\n"
+    "           • Цена с наценкой: {extra_charge_price} ₽\n"
+)
+NO_SUPPLIERS = "    ❌ Нет данных о поставщиках.\n"
+
+# Шаблон сообщения о заявке
+APPLICATION = (
+    "<b>📄 {title} №{id}</b>\n\n"
+    "<b>Информация о заявке:</b>\n"
+    "📝 <b>Статус:</b> {status}\n"
+    "📧 <b>Email:</b> {email}\n"
+    "📞 <b>Телефон:</b> {tel}\n"
+    "💬 <b>Комментарий:</b> {comment}\n"
+    "📅 <b>Создана:</b> {created}\n"
+)
+
+
+# Строки сводки уведомлений
+DIGEST_HEADER = "<b>🔔 Новые события: {count}</b>\n\n"
+ORDER_DIGEST_LINE = (
+    '📦 <a href="https://ass74.ru/order/{token}">Заказ №{id}</a> | {total} ₽ | {first_name} {last_name}\n'
+)
+APPLICATION_DIGEST_LINE = "📄 Заявка №{id} | {name} | {tel}\n"
+IMPORT_DIGEST_LINE = "{icon} Импорт {supplier} | {task} | {status}\n"
+DIGEST_MORE = "\n…и ещё {count}"
+
+def render_order(detail: dict, title: str = "Заказ") -> str:
+    """Формирует HTML-текст заказа с товарами и остатками у поставщиков."""
+    items = detail['items']
+    parts = [ORDER_HEADER.format(
+        title=title,
+        id=detail['id'],
+        status=detail['status']['status_name'],
+        total=detail['total_price_with_discount'],
+        quantity=sum(item['quantity'] for item in items),
+        positions=len(items),
+        address=detail['address'] or 'Не указан',
+        first_name=detail['first_name'],
+        last_name=detail['last_name'] or '',
+        patronymic=detail['patronymic'] or '',
+        email=detail['email'] or 'Не указан',
+        tel=detail['tel'] or 'Не указан',
+    )]
+    for idx, item in enumerate(items, start=1):
+        product = item['product']
+        parts.append(ORDER_ITEM.format(
+            idx=idx,
+            name=product['name'],
+            item_number=product['item_number'],
+            price=item['price'],
+            quantity=item['quantity'],
+        ))
+        # Разбивка по поставщикам
+        suppliers = product.get('product_supplier_info')
+        if suppliers:
+            parts.append(SUPPLIERS_HEADER)
+            parts.extend(
+                SUPPLIER_STOCK.format(
+                    name=supplier.get('supplier_info', {}).get('name', 'Неизвестный поставщик'),
+                    quantity=supplier['quantity'],
+                    purchase_price=supplier['purchase_price'],
+                    extra_charge_price=supplier['extra_charge_price'],
+                )
+                for supplier in suppliers
+            )
+        else:
+            parts.append(NO_SUPPLIERS)
+        parts.append("\n")
+    return "".join(parts)
+
+
+def render_application(application: dict, title: str = "Заявка") -> str:
+    """Формирует HTML-текст заявки обратной связи."""
+    return APPLICATION.format(
+        title=title,
+        id=application['id'],
+        status=application['status'],
+        email=application['email'] or 'Не указан',
+        tel=application['tel'] or 'Не указан',
+        comment=application['comment'] or 'Отсутствует',
+        created=application['created'],
+    )
+
+
+def order_digest_line(detail: dict) -> str:
+    """Строка заказа для сводки уведомлений."""
+    return ORDER_DIGEST_LINE.format(
+        token=detail['unique_token'],
+        id=detail['id'],
+        total=detail['total_price_with_discount'],
+        first_name=detail.get('first_name') or '',
+        last_name=detail.get('last_name') or '',
+    )
+
+
+def application_digest_line(application: dict) -> str:
+    """Строка заявки для сводки уведомлений."""
+    return APPLICATION_DIGEST_LINE.format(
+        id=application['id'],
+        name=application.get('name', 'Не указано'),
+        tel=application.get('tel', 'Не указан'),
+    )
+
+# Оповещение об изменении статуса импорта поставщика
+IMPORT_ALERT = (
+    "<b>{icon} Импорт поставщика {supplier}</b>\n"
+    "<b>{task}:</b> {previous_status} → <b>{status}</b>\n"
+    "<b>Дата:</b> {last_run_time}"
+)
+IMPORT_TASK_NAMES = {"tire": "Шины", "disk": "Диски"}
+
+
+def _import_fields(change: dict) -> dict:
+    return dict(
+        change,
+        icon="❌" if change.get('failed') else "✅",
+        task=IMPORT_TASK_NAMES.get(change['task'], change['task']),
+        last_run_time=change.get('last_run_time') or 'Нет данных',
+    )
+
+
+def render_import_alert(change: dict) -> str:
+    """Оповещение об изменении статуса импорта."""
+    return IMPORT_ALERT.format(**_import_fields(change))
+
+
+def import_digest_line(change: dict) -> str:
+    """Строка изменения импорта для сводки уведомлений."""
+    return IMPORT_DIGEST_LINE.format(**_import_fields(change))
+
+# Готовые тексты: (тип, id сущности, версия, заголовок) -> (данные, текст); записи не устаревают
+render_cache = TTLCache(RENDER_CACHE_SIZE, float("inf"))
+
+
+def _view(kind: str, data: dict, title: str, render: Callable[[dict, str], str]) -> str:
+    """Текст из кэша или сформированный заново.
+
+    Версия данных — сам загруженный объект: кэш API отдаёт один и тот же
+    словарь, пока не загрузит данные заново. Запись хранит ссылку на него,
+    поэтому id(data) не может достаться другому объекту, пока запись жива.
+    """
+    key = (kind, data['id'], id(data), title)
+    item = render_cache.get(key)
+    if item is not None:
+        return item[1]
+    text = render(data, title)
+    render_cache.set(key, (data, text))
+    return text
+
+
+def order_view(detail: dict, title: str = "Заказ") -> str:
+    """Текст заказа из кэша; формируется заново только для новых данных."""
+    return _view("order", detail, title, render_order)
+
+
+def application_view(application: dict, title: str = "Заявка") -> str:
+    """Текст заявки из кэша; формируется заново только для новых данных."""
+    return _view("application", application, title, render_application)
+
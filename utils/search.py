@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+from api.client import APIClient, api_client
+from config.settings import ORDER_INDEX_BACKFILL_PAGES, ORDER_INDEX_BACKFILL_INTERVAL, FIND_RESULTS_LIMIT
+from utils.database import Database, database
+from utils.db import get_authorized_users
+
+log = logging.getLogger(__name__)
+
+# Запрос похож на телефон: цифры, пробелы, +, скобки и дефисы, не меньше 5 цифр
+PHONE_QUERY = re.compile(r"^\+?[\d\s()\-]{5,}$")
+# Триграммный токенизатор не находит строки короче трёх символов
+MIN_TERM = 3
+# Через сколько секунд повторить обход, если он не удался или некому его выполнить
+BACKFILL_RETRY_DELAY = 60
+
+
+def phone_digits(value: Optional[str]) -> str:
+    """Телефон без форматирования и кода страны: «+7 (963) 000-00-01» -> «9630000001»."""
+    digits = re.sub(r"\D", "", value or "")
+    if len(digits) == 11 and digits[0] in "78":
+        digits = digits[1:]
+    return digits
+
+
+# Колонка индекса -> поля заказа, из которых она строится
+SOURCE_FIELDS = {
+    'customer': ('last_name', 'first_name', 'patronymic'),
+    'phone': ('tel',),
+    'email': ('email',),
+    'address': ('address',),
+    'items': ('items',),
+}
+
+
+def order_summary(order: dict, customer: str) -> str:
+    """Строка результата поиска."""
+    status = (order.get('status') or {}).get('status_name', '')
+    return f"№{order['id']} | {status} | {order.get('total_price_with_discount', '')} ₽ | {customer}"
+
+
+def order_document(order: dict) -> Tuple:
+    """Поля заказа для индекса: (id, клиент, телефон, email, адрес, товары, строка результата)."""
+    customer = " ".join(filter(None, (order.get('last_name'), order.get('first_name'), order.get('patronymic'))))
+    items = " ".join(
+        f"{item.get('product', {}).get('item_number') or ''} {item.get('product', {}).get('name') or ''}".strip()
+        for item in order.get('items') or []
+    )
+    return (order['id'], customer, phone_digits(order.get('tel')), order.get('email') or '',
+            order.get('address') or '', items, order_summary(order, customer))
+
+
+def missing_columns(order: dict) -> Set[str]:
+    """Колонки, данных для которых в заказе нет (например, в ответе списка заказов)."""
+    missing = {column for column, fields in SOURCE_FIELDS.items() if not any(field in order for field in fields)}
+    if not order.get('items'):
+        missing.add('items')
+    return missing
+
+
+def match_query(query: str) -> Optional[str]:
+    """Выражение FTS5 из запроса пользователя; None, если искать нечего.
+
+    Телефон ищется по цифрам в колонке phone, остальные слова — подстрокой
+    в любом поле; все условия должны выполняться. Запрос из одних цифр
+    может быть и артикулом, поэтому ищется ещё и в товарах.
+    """
+    query = query.strip()
+    if PHONE_QUERY.match(query):
+        digits = phone_digits(query)
+        variants = {digits}
+        # Неполный номер, набранный с 8 или +7: ищем и без кода страны
+        if digits[:1] in ("7", "8") and len(digits) < 11:
+            variants.add(digits[1:])
+        variants = sorted(variant for variant in variants if len(variant) >= MIN_TERM)
+        conditions = [f'phone : "{variant}"' for variant in variants]
+        if query.isdigit():
+            conditions.append(f'items : "{query}"')
+        return " OR ".join(conditions) or None
+    terms = [term.replace('"', '""') for term in query.split() if len(term) >= MIN_TERM]
+    return " AND ".join(f'"{term}"' for term in terms) or None
+
+
+class OrderIndex:
+    """Локальный полнотекстовый индекс заказов (SQLite FTS5, триграммы).
+
+    Заказы попадают в индекс из вебхука и при фоновом обходе списка заказов,
+    поэтому поиск отвечает без запросов к сайту. Триграммы позволяют искать
+    по части телефона, артикула или фамилии.
+    """
+
+    def __init__(self, client: APIClient, db: Database, backfill_pages: int = ORDER_INDEX_BACKFILL_PAGES,
+                 backfill_interval: float = ORDER_INDEX_BACKFILL_INTERVAL):
+        self.client = client
+        self.db = db
+        self.backfill_pages = backfill_pages
+        self.backfill_interval = backfill_interval
+        self._backfill_user: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def init(self):
+        """Создаёт таблицы индекса."""
+        def _init(conn):
+            with conn:
+                # rowid — номер заказа
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS order_search USING fts5(
+                        customer, phone, email, address, items, summary UNINDEXED,
+                        tokenize = 'trigram'
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS order_search_meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    )
+                """)
+
+        self.db.run_sync(_init)
+
+    async def add(self, orders: Iterable[dict]):
+        """Добавляет или обновляет заказы одной транзакцией.
+
+        В списке заказов может не быть товаров, телефона или адреса: тогда
+        обновляются только пришедшие поля, а остальные сохраняются из уже
+        проиндексированного заказа (например, из вебхука).
+        """
+        documents = [(order, order_document(order), missing_columns(order)) for order in orders]
+
+        def _add(conn):
+            with conn:
+                for order, document, missing in documents:
+                    order_id, customer, phone, email, address, items, summary = document
+                    row = None
+                    if missing:
+                        row = conn.execute(
+                            "SELECT customer, phone, email, address, items FROM order_search WHERE rowid = ?",
+                            (order_id,)
+                        ).fetchone()
+                    if row is not None:
+                        stored = dict(zip(('customer', 'phone', 'email', 'address', 'items'), row))
+                        customer, phone, email, address, items = (
+                            stored[column] if column in missing else value
+                            for column, value in zip(stored, (customer, phone, email, address, items))
+                        )
+                        summary = order_summary(order, customer)
+                    conn.execute("DELETE FROM order_search WHERE rowid = ?", (order_id,))
+                    conn.execute(
+                        "INSERT INTO order_search (rowid, customer, phone, email, address, items, summary) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (order_id, customer, phone, email, address, items, summary)
+                    )
+
+        await self.db.run(_add)
+
+    async def known(self, order_ids: List[int]) -> Set[int]:
+        """Какие из заказов уже есть в индексе."""
+        if not order_ids:
+            return set()
+        rows = await self.db.fetchall(
+            f"SELECT rowid FROM order_search WHERE rowid IN ({', '.join('?' * len(order_ids))})", order_ids
+        )
+        return {row[0] for row in rows}
+
+    async def search(self, query: str, limit: int = FIND_RESULTS_LIMIT) -> List[Tuple[int, str]]:
+        """Ищет заказы: [(номер, строка результата)], сначала лучшие совпадения."""
+        results = []
+        # Число может быть номером заказа
+        if query.strip().isdigit():
+            results = await self.db.fetchall(
+                "SELECT rowid, summary FROM order_search WHERE rowid = ?", (int(query.strip()),)
+            )
+        expression = match_query(query)
+        if expression is not None:
+            results += await self.db.fetchall(
+                "SELECT rowid, summary FROM order_search WHERE order_search MATCH ? "
+                "ORDER BY rank, rowid DESC LIMIT ?",
+                (expression, limit)
+            )
+        unique = {}
+        for order_id, summary in results:
+            unique.setdefault(order_id, summary)
+        return list(unique.items())[:limit]
+
+    async def backfill(self, telegram_id: int):
+        """Обходит список заказов на сайте и индексирует его.
+
+        Первый обход проходит все страницы (или backfill_pages), следующие
+        останавливаются на первой странице, заказы которой уже в индексе.
+        """
+        complete = await self.db.fetchone("SELECT value FROM order_search_meta WHERE key = 'backfill_complete'")
+        page, total_pages = 1, 1
+        while page <= total_pages and (self.backfill_pages <= 0 or page <= self.backfill_pages):
+            # Мимо кэша страниц: обход не должен вытеснять страницы, которые листают пользователи
+            response = await self.client.get_orders(telegram_id, page, cached=False)
+            orders = response.get("data", [])
+            if not orders:
+                break
+            total_pages = response.get("total_pages", 1)
+            if complete and len(await self.known([order['id'] for order in orders])) == len(orders):
+                break
+            await self.add(orders)
+            page += 1
+        await self.db.execute(
+            "INSERT OR REPLACE INTO order_search_meta (key, value) VALUES ('backfill_complete', '1')"
+        )
+        log.info("Индекс заказов обновлён: %s стр.", page - 1)
+
+    async def backfill_any(self) -> bool:
+        """Обходит список от имени первого авторизованного пользователя, у которого это получится."""
+        users = list(get_authorized_users())
+        # Сначала тот, от имени которого получилось в прошлый раз
+        if self._backfill_user in users:
+            users.remove(self._backfill_user)
+            users.insert(0, self._backfill_user)
+        for telegram_id in users:
+            try:
+                await self.backfill(telegram_id)
+                self._backfill_user = telegram_id
+                return True
+            except Exception:
+                log.exception("Не удалось обновить индекс заказов от имени %s", telegram_id)
+        return False
+
+    def start(self):
+        """Запускает периодический обход списка заказов; неудачный обход повторяется раньше."""
+        if self.backfill_pages < 0:
+            return
+
+        async def _loop():
+            while True:
+                done = await self.backfill_any()
+                await asyncio.sleep(self.backfill_interval if done else BACKFILL_RETRY_DELAY)
+
+        self._task = asyncio.create_task(_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Локальный поисковый индекс заказов
+order_index = OrderIndex(api_client, database)
@@ -0,0 +1,71 @@
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Callable, List
+
+log = logging.getLogger(__name__)
+
+# Сколько ждать запуска нового процесса при плавном перезапуске
+RESTART_GRACE = 5
+# Сколько ждать завершения процесса после SIGTERM
+STOP_TIMEOUT = 30
+
+
+def supervise(target: Callable[[], None], count: int):
+    """Запускает count процессов target и следит за ними.
+
+    Процессы слушают один порт через SO_REUSEPORT, упавший процесс
+    перезапускается. SIGHUP перезапускает процессы по одному (новый код
+    подхватывается без простоя), SIGTERM и SIGINT останавливают все.
+    """
+    # spawn: каждый процесс заново импортирует приложение и открывает свои соединения
+    context = multiprocessing.get_context("spawn")
+    state = {"stopping": False, "reload": False}
+
+    def start():
+        process = context.Process(target=target, daemon=False)
+        process.start()
+        log.info("Запущен процесс %s", process.pid)
+        return process
+
+    def stop(process):
+        process.terminate()
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            log.warning("Процесс %s не остановился, завершаем принудительно", process.pid)
+            process.kill()
+            process.join()
+
+    def on_stop(signum, frame):
+        state["stopping"] = True
+
+    def on_reload(signum, frame):
+        state["reload"] = True
+
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGHUP, on_reload)
+
+    processes: List[multiprocessing.Process] = [start() for _ in range(count)]
+    while not state["stopping"]:
+        time.sleep(0.5)
+        if state["reload"]:
+            state["reload"] = False
+            log.info("Плавный перезапуск процессов")
+            for index, old in enumerate(processes):
+                if state["stopping"]:
+                    break
+                # Новый процесс начинает принимать соединения до остановки старого
+                processes[index] = start()
+                time.sleep(RESTART_GRACE)
+                stop(old)
+        for index, process in enumerate(processes):
+            if not process.is_alive() and not state["stopping"]:
+                log.warning("Процесс %s завершился с кодом %s, перезапускаем", process.pid, process.exitcode)
+                processes[index] = start()
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        stop(process)